@@ -0,0 +1,196 @@
+import math
+import os
+import random
+import sys
+from settings import *
+
+
+# Street names, cities, and the share of packages with each delivery deadline, modeled on the shipped package file.
+STREETS = ['Oakland Ave', 'Canyon Rd', 'Lester St', 'Dalton Ave', 'Parkway Blvd', 'Price Ave', 'Main St', 'State St',
+           'Valley Loop', 'Taylorsville Blvd', 'Highland Dr', 'Redwood Rd', 'Bangerter Hwy', 'Fort Union Blvd']
+CITIES = ['Salt Lake City', 'West Valley City', 'Millcreek', 'Holladay', 'Murray', 'Taylorsville', 'Cottonwood']
+DEADLINES = [('9:00 AM', 1 / 40), ('10:30 AM', 13 / 40)]
+
+
+class CityGenerator:
+    """This is the city generator class that builds synthetic cities for development and scaling studies. Addresses
+    are placed in a plane in clusters around neighborhood centers, with the Hub near the middle. Road distances are the
+    straight-line distances stretched by a circuity factor that varies for each pair of addresses, and some directions
+    carry an extra one-way detour, so the matrix is asymmetric the way real streets are.
+
+    Packages get deadlines, weights, groups, truck restrictions, and delayed and bad address notes in the same shares
+    as the shipped package file. The city is written as a distance file and a package file in the exact format Prepper
+    reads, and as a coordinate file for the coordinate distance source. The distance file holds the full matrix, so the
+    one-way distances reach the route engines."""
+    def __init__(self, addresses=CITY_ADDRESSES, packages=CITY_PACKAGES, seed=CITY_SEED, size=CITY_SIZE,
+                 groups=CITY_GROUPS):
+        """Initialize generator variables."""
+        self.address_count = addresses  # Number of addresses, including the Hub.
+        self.package_count = packages  # Number of packages.
+        self.size = size  # Width and height of the city in miles.
+        self.group_count = groups  # Number of package groups that must be delivered together.
+        self.random = random.Random(seed)  # Random number generator. The same seed builds the same city.
+        self.coordinates = []  # (x, y) in miles, one for each address index. The Hub is index 0.
+        self.addresses = []  # (name, street, city, zip), one for each address index.
+        self.matrix = []  # Road distances in miles. Row is the start address and column is the end address.
+        self.package_table = []  # Package rows as written to the package file.
+
+    def build(self):
+        """Builds the addresses, the road distance matrix, and the packages. O(A^2 + P)."""
+        self.place_addresses()
+        self.make_road_matrix()
+        self.make_packages()
+        return self
+
+    def place_addresses(self):
+        """Places the Hub near the middle and every other address around a random neighborhood center. Each
+        neighborhood has its own city and zipcode. O(A)."""
+        generator = self.random
+        middle = self.size / 2
+        centers = [(generator.uniform(0.15, 0.85) * self.size, generator.uniform(0.15, 0.85) * self.size)
+                   for _ in range(max(1, self.address_count // 8))]
+        streets = set()
+        for index in range(self.address_count):
+            if index == 0:
+                x, y, neighborhood = middle, middle, 0
+            else:
+                neighborhood = generator.randrange(len(centers))
+                x, y = (min(self.size, max(0.0, generator.gauss(center, self.size / 12)))
+                        for center in centers[neighborhood])
+            # Street addresses are made from the coordinates and kept unique.
+            number = 100 + int(x * 100)
+            street = "%d %s" % (number, STREETS[int(y) % len(STREETS)])
+            while street in streets:
+                number = number + 1
+                street = "%d %s" % (number, STREETS[int(y) % len(STREETS)])
+            streets.add(street)
+            city = CITIES[neighborhood % len(CITIES)]
+            name = "Distribution Hub" if index == 0 else "%s Stop %d" % (city, index)
+            self.coordinates.append((round(x, 3), round(y, 3)))
+            self.addresses.append((name, street, city, str(84101 + 2 * neighborhood)))
+
+    def make_road_matrix(self):
+        """Builds the road distance matrix. Both directions between two addresses share a circuity factor, and a
+        share of directions add a one-way detour. Distances are rounded to tenths of a mile like the shipped file, and
+        two addresses are never less than a tenth of a mile apart. O(A^2)."""
+        generator = self.random
+        size = self.address_count
+        self.matrix = [[0.0] * size for _ in range(size)]
+        for start in range(size):
+            for end in range(start):
+                (x, y), (a, b) = self.coordinates[start], self.coordinates[end]
+                road = math.hypot(x - a, y - b) * CITY_CIRCUITY * generator.uniform(0.95, 1.15)
+                for row, column in ((start, end), (end, start)):
+                    detour = generator.uniform(0.2, 1.0) if generator.random() < CITY_ONE_WAY else 0.0
+                    self.matrix[row][column] = max(0.1, round(road + detour, 1))
+
+    def make_packages(self):
+        """Builds the package rows. Some addresses get many more packages than others, up to the address limit.
+        Deadlines, truck restrictions, and delayed packages come in the shares of the shipped file, and each group has
+        three packages. O(A * P)."""
+        generator = self.random
+        if self.package_count > CITY_ADDRESS_LIMIT * (self.address_count - 1):
+            raise ValueError("%d addresses cannot hold %d packages with at most %d packages at each address."
+                             % (self.address_count, self.package_count, CITY_ADDRESS_LIMIT))
+        # Every package at an address is loaded onto the same truck, so no address gets more than the address limit.
+        popularity = [generator.paretovariate(1.5) for _ in range(1, self.address_count)]
+        destinations, counts = [], [0] * self.address_count
+        while len(destinations) < self.package_count:
+            address = generator.choices(range(1, self.address_count), weights=popularity)[0]
+            destinations.append(address)
+            counts[address] = counts[address] + 1
+            if counts[address] == CITY_ADDRESS_LIMIT:
+                popularity[address - 1] = 0.0
+        self.package_table = []
+        for number, address in enumerate(destinations, 1):
+            deadline = 'EOD'
+            draw = generator.random()
+            for time, share in DEADLINES:
+                if draw < share:
+                    deadline = time
+                    break
+                draw = draw - share
+            # Weights are mostly light, with a few heavy packages. A weight equal to the next package ID would be read
+            # as the start of the next package, so it is never used.
+            weight = 88 if generator.random() < 0.1 else generator.randint(1, 45)
+            if weight == number + 1:
+                weight = weight + 1
+            _, street, city, zipcode = self.addresses[address]
+            self.package_table.append([str(number), street, city, 'UT', zipcode, deadline, str(weight), ''])
+
+        # Special notes are given to packages without notes.
+        plain = self.package_table[:]
+        generator.shuffle(plain)
+        for _ in range(min(self.group_count, len(plain) // 3)):
+            # The other two packages are grouped by the note of the first package.
+            first, second, third = plain.pop(), plain.pop(), plain.pop()
+            first[-1] = '"Must be delivered with %s, %s"' % (second[0], third[0])
+        for _ in range(round(self.package_count * 4 / 40)):
+            if plain:
+                plain.pop()[-1] = 'Can only be on truck 2'
+        for _ in range(round(self.package_count * 4 / 40)):
+            if plain:
+                plain.pop()[-1] = 'Delayed on flight---will not arrive to depot until 9:05 am'
+        if plain and self.package_count >= 10:
+            plain.pop()[-1] = 'Wrong address listed'
+
+    def write(self, directory):
+        """Writes the distance, package, and coordinate files into a directory with the shipped file names. Returns
+        the three file names. O(A^2 + P)."""
+        os.makedirs(directory, exist_ok=True)
+        names = [os.path.join(directory, os.path.basename(name))
+                 for name in (DISTANCE_FILE, PACKAGE_FILE, COORDINATE_FILE)]
+        self.write_distance_file(names[0])
+        self.write_package_file(names[1])
+        self.write_coordinate_file(names[2])
+        return names
+
+    def write_distance_file(self, file_name):
+        """Writes the matrix in the format of the shipped distance file. Every line has two label columns and one
+        column for each address. The first label holds the address name and street, and the second holds the street
+        and zipcode that package addresses are matched on. The shipped file holds only the lower triangle, but every
+        row here is full, because the distances differ by direction. O(A^2)."""
+        size = self.address_count
+        lines = [[''] * (size + 2) for _ in range(4)]
+        lines[0][1], lines[2][2] = 'Package Distance Table', 'NHP1 : Amazon Routing Program'
+        header = ['DISTANCE BETWEEN HUBS IN MILES', '']
+        hub_name, hub_street, hub_city, hub_zip = self.addresses[0]
+        for index, (name, street, city, zipcode) in enumerate(self.addresses):
+            if index == 0:
+                header.append('"%s\n%s, \n%s, UT %s"' % (hub_name, hub_street, hub_city, hub_zip))
+            else:
+                header.append('"%s\n %s"' % (name, street))
+        lines.append(header)
+        for index, (name, street, city, zipcode) in enumerate(self.addresses):
+            if index == 0:
+                labels = [header[2], ' HUB']
+            else:
+                labels = ['"%s\n %s"' % (name, street), '" %s\n(%s)"' % (street, zipcode)]
+            lines.append(labels + ['%g' % distance for distance in self.matrix[index]])
+        with open(file_name, 'w', newline='') as file_python:
+            file_python.write(''.join(','.join(line) + '\n' for line in lines))
+
+    def write_package_file(self, file_name, packages=None):
+        """Writes package rows in the format of the shipped package file. O(P)."""
+        lines = ['Package Table File,,,,,,,', ',,,,,,,', 'NHP1 : Amazon Routing Program,,,,,,,', ',,,,,,,',
+                 '"Package\nID",Address,City ,State,Zip,"Delivery\nDeadline","Mass\nKILO",page 1 of 1PageSpecial Notes']
+        lines.extend(','.join(package) for package in (self.package_table if packages is None else packages))
+        with open(file_name, 'w', newline='') as file_python:
+            file_python.write('\n'.join(lines) + '\n')
+
+    def write_coordinate_file(self, file_name):
+        """Writes one 'address index,x,y' line for each address, read by the coordinate distance source. O(A)."""
+        with open(file_name, 'w', newline='') as file_python:
+            file_python.write('address,x,y\n')
+            for index, (x, y) in enumerate(self.coordinates):
+                file_python.write('%d,%s,%s\n' % (index, x, y))
+
+
+if __name__ == '__main__':
+    # Usage: python city.py <directory> [addresses] [packages] [seed]
+    if len(sys.argv) < 2:
+        print("Usage: python city.py <directory> [addresses] [packages] [seed]")
+    else:
+        city = CityGenerator(*[int(argument) for argument in sys.argv[2:5]]).build()
+        for written in city.write(sys.argv[1]):
+            print("Wrote " + written)
@@ -0,0 +1,249 @@
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+import types
+from distances import is_symmetric
+from objects import Hub
+from paths import shortest_path
+from settings import *
+
+
+class RouteCorpus:
+    """This is the route corpus class that stores small subset matrix instances with known optimal routes, and checks
+    every route engine against them. Each instance is a subset matrix with the Hub at index 0, a flag for whether the
+    truck returns to the Hub, and the optimal cost and tour found by an exact solver.
+
+    Instances are taken from the shipped distance and package files, and generated from random points. Some generated
+    instances are asymmetric and some contain tied distances, so engines that break ties or round differently are
+    caught."""
+    def __init__(self, instances=None):
+        """Initialize corpus variables."""
+        self.instances = instances or []  # List of instance dictionaries.
+        self.engines = {'fast': self.run_fast, 'slow': self.run_slow, 'parallel': self.run_parallel,
+                        'path': self.run_path, 'exact': self.run_exact}  # Route engines.
+        self.solver = None  # Branch solver for the parallel engine. Started on first use.
+
+    def __len__(self):
+        """Return number of instances. O(1)."""
+        return len(self.instances)
+
+    def add(self, name, matrix, last_trip):
+        """Solves an instance exactly and adds it to the corpus. O(2^K * K^2)."""
+        cost, tour = exact_route(matrix, last_trip)
+        self.instances.append({'name': name, 'matrix': matrix, 'last_trip': last_trip, 'cost': cost, 'tour': tour})
+
+    def build(self, prep, count=CORPUS_INSTANCES, seed=CORPUS_SEED):
+        """Builds the corpus from the shipped files and from random points. Instances have at most CORPUS_MAX_STOPS
+        stops after the Hub. O(C * 2^K * K^2)."""
+        generator = random.Random(seed)
+        addresses = sorted({package[-1] for package in prep.package_table} - {0})
+        for number in range(count):
+            stops = generator.randint(2, CORPUS_MAX_STOPS)
+            last_trip = number % 2 == 1
+            kind = number % 4
+            if kind < 2:
+                # Distances between package addresses from the shipped files.
+                subset = [0] + sorted(generator.sample(addresses, stops))
+                matrix = prep.distances.submatrix(subset)
+                self.add("shipped-%03d" % number, matrix, last_trip)
+            elif kind == 2:
+                # Symmetric distances between random points, rounded to tenths of a mile so that ties occur.
+                points = [(generator.uniform(0, 10), generator.uniform(0, 10)) for _ in range(stops + 1)]
+                matrix = [[round(((a - c) ** 2 + (b - d) ** 2) ** 0.5, 1) for c, d in points] for a, b in points]
+                self.add("symmetric-%03d" % number, matrix, last_trip)
+            else:
+                # Asymmetric distances, such as one-way streets.
+                size = stops + 1
+                matrix = [[0.0 if row == column else round(generator.uniform(0.5, 9.5), 1) for column in range(size)]
+                          for row in range(size)]
+                self.add("asymmetric-%03d" % number, matrix, last_trip)
+
+    def save(self, file_name=CORPUS_FILE):
+        """Writes the corpus to a compact JSON file with one instance on each line, so the file stays small and a
+        changed instance shows up as one changed line. O(C * K^2)."""
+        lines = [json.dumps(instance, separators=(',', ':')) for instance in self.instances]
+        with open(file_name, 'w') as file_python:
+            file_python.write('{"instances":[\n' + ',\n'.join(lines) + '\n]}\n')
+
+    @classmethod
+    def load(cls, file_name=CORPUS_FILE):
+        """Reads a corpus from a JSON file. O(C * K^2)."""
+        with open(file_name) as file_python:
+            return cls(json.load(file_python)['instances'])
+
+    def check(self, names=None):
+        """Runs every route engine against every instance. Returns one result per engine with the number of instances
+        solved, the number of mismatches, the largest cost delta, the total runtime, and the mismatched instance names.
+        A mismatch is a cost that differs from the optimal cost or a tour whose distances do not add up to its cost.
+        O(E * C * K!)."""
+        results = []
+        for name in names or list(self.engines):
+            engine = self.engines[name]
+            result = {'engine': name, 'solved': 0, 'mismatches': 0, 'max_delta': 0.0, 'seconds': 0.0, 'failed': []}
+            for instance in self.instances:
+                start = time.perf_counter()
+                cost, tour = engine(instance['matrix'], instance['last_trip'])
+                result['seconds'] = result['seconds'] + time.perf_counter() - start
+                result['solved'] = result['solved'] + 1
+                delta = round(cost - instance['cost'], 2)
+                valid = tour is None or self.valid_tour(instance, tour, cost)
+                result['max_delta'] = max(result['max_delta'], abs(delta))
+                if delta or not valid:
+                    result['mismatches'] = result['mismatches'] + 1
+                    result['failed'].append(instance['name'])
+            results.append(result)
+        if self.solver is not None:
+            self.solver.close()
+            self.solver = None
+        return results
+
+    @staticmethod
+    def valid_tour(instance, tour, cost):
+        """Determines if a tour starts at the Hub, visits every stop once, returns to the Hub unless it is the last
+        trip, and has distances that add up to its cost. O(K)."""
+        matrix = instance['matrix']
+        stops = tour[:-1] if not instance['last_trip'] else tour
+        if tour[0] != 0 or sorted(stops) != list(range(len(matrix))):
+            return False
+        if not instance['last_trip'] and tour[-1] != 0:
+            return False
+        return round(sum(matrix[a][b] for a, b in zip(tour, tour[1:])), 2) == round(cost, 2)
+
+    @staticmethod
+    def engine_hub(matrix, last_trip):
+        """Returns a Hub that holds only what the route engines read: the subset matrix, its symmetry, and the truck.
+        O(K^2)."""
+        hub = Hub.__new__(Hub)
+        hub.subset_matrix = matrix
+        hub.symmetric = is_symmetric(matrix)
+        hub.unique_count = len(matrix)
+        hub.basecase = [True] * hub.unique_count
+        hub.fastest_route = [INT_MAX, [INT_MAX], INT_MAX]
+        hub.truck = types.SimpleNamespace(last_trip=last_trip)
+        return hub
+
+    def run_fast(self, matrix, last_trip):
+        """Runs hamiltonian_cycle_fast. The fast engine finds the cost only. O(K!)."""
+        hub = self.engine_hub(matrix, last_trip)
+        bitmap = [False] * hub.unique_count
+        bitmap[0] = True
+        hub.hamiltonian_cycle_fast(bitmap, 0, 0)
+        return hub.fastest_route[0], None
+
+    def run_slow(self, matrix, last_trip):
+        """Runs hamiltonian_cycle_slow. O(K!)."""
+        hub = self.engine_hub(matrix, last_trip)
+        bitmap = [False] * hub.unique_count
+        bitmap[0] = True
+        hub.hamiltonian_cycle_slow(bitmap, 0, 0, [], [0])
+        return hub.fastest_route[0], hub.fastest_route[1]
+
+    def run_parallel(self, matrix, last_trip):
+        """Runs the branch solver on every instance, however small. O(K! / W)."""
+        if self.solver is None:
+            from solver import BranchSolver
+            self.solver = BranchSolver(max(2, SOLVE_WORKERS or 2))
+        cost, tour, _ = self.solver.solve(matrix, last_trip)
+        return cost, tour
+
+    def run_path(self, matrix, last_trip):
+        """Runs the path solver. A route that returns to the Hub is a path that ends at the Hub. O(K!)."""
+        cost, tour, _ = shortest_path(matrix, None if last_trip else 0)
+        return cost, tour
+
+    def run_exact(self, matrix, last_trip):
+        """Runs the exact solver. O(2^K * K^2)."""
+        return exact_route(matrix, last_trip)
+
+
+def exact_route(matrix, last_trip):
+    """Finds the optimal route through a subset matrix with the Held-Karp dynamic program. The route starts at index 0
+    and returns to index 0 unless it is the last trip. Costs are rounded the same way as the route engines. Returns the
+    cost and the tour as subset indexes. O(2^K * K^2)."""
+    size = len(matrix)
+    if size == 1:
+        return 0.0, [0] if last_trip else [0, 0]
+    full = (1 << size) - 2  # Every stop except the Hub.
+    # Key = (visited stops bitmask, last stop); Value = (lowest cost, stop before the last stop).
+    best = {(1 << stop, stop): (matrix[0][stop], 0) for stop in range(1, size)}
+    for visited in range(2, full + 1, 2):
+        for last in range(1, size):
+            if (visited, last) not in best:
+                continue
+            cost = best[(visited, last)][0]
+            for stop in range(1, size):
+                if visited & 1 << stop:
+                    continue
+                key = (visited | 1 << stop, stop)
+                new_cost = cost + matrix[last][stop]
+                if key not in best or new_cost < best[key][0]:
+                    best[key] = (new_cost, last)
+
+    # Closes the tour at the Hub unless it is the last trip.
+    ends = [(best[(full, last)][0] + (0 if last_trip else matrix[last][0]), last) for last in range(1, size)]
+    cost, last = min(ends)
+    tour = [] if last_trip else [0]
+    visited = full
+    while last:
+        tour.append(last)
+        visited, last = visited & ~(1 << last), best[(visited, last)][1]
+    tour.append(0)
+    return round(cost, 2), tour[::-1]
+
+
+def check_relay(truck=1):
+    """Runs the shipped day with the last trip of a truck ending at a relay point that no package is sent to. The
+    relay point is an address whose packages have no notes, deadline or group, and those packages are removed. The Hub
+    must reach the relay point from its own subset distances. Returns the relay address, whether the day ended with
+    every package delivered, and the address where the truck stopped. O(M * N!)."""
+    from main import Simulation, prepare
+    prepper = prepare()
+    table = prepper.package_table
+    special = {package[-1] for package in table if package[5] != 'EOD' or package[7] != 'Empty' or
+               package[0] in prepper.package_groups}
+    relay = max({package[-1] for package in table} - special - set(DEPOT_ADDRESSES))
+    table[:] = [package for package in table if package[-1] != relay]
+    saved = dict(TRUCK_RELAYS)
+    TRUCK_RELAYS.clear()
+    TRUCK_RELAYS[truck] = relay
+    try:
+        simulation = Simulation(prepper)
+        simulation.run_headless()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            simulation.setup()
+            limit = simulation.time.total_seconds() + 86400
+            while not simulation.finished and simulation.time.total_seconds() < limit:
+                simulation.step()
+    finally:
+        TRUCK_RELAYS.clear()
+        TRUCK_RELAYS.update(saved)
+    return relay, simulation.finished, simulation.trucks[truck - 1].current
+
+
+if __name__ == '__main__':
+    # Usage: python corpus.py build
+    #        python corpus.py check [engine ...]
+    #        python corpus.py relay
+    if sys.argv[1:2] == ['build']:
+        from main import Prepper
+        prepper = Prepper()
+        prepper.execute()
+        corpus = RouteCorpus()
+        corpus.build(prepper)
+        corpus.save()
+        print("Saved " + str(len(corpus)) + " instances to " + CORPUS_FILE)
+    elif sys.argv[1:2] == ['check']:
+        corpus = RouteCorpus.load()
+        for row in corpus.check(sys.argv[2:] or None):
+            print("%-10s solved %4d  mismatches %4d  max delta %6.2f  %8.3f s  %s" % (
+                row['engine'], row['solved'], row['mismatches'], row['max_delta'], row['seconds'],
+                ", ".join(row['failed'][:5])))
+    elif sys.argv[1:2] == ['relay']:
+        relay, finished, current = check_relay()
+        print("Relay point %d: %s, Truck 1 stopped at address %d" % (
+            relay, "every package delivered" if finished else "did not finish", current))
+    else:
+        print("Usage: python corpus.py build | check [engine ...] | relay")
@@ -0,0 +1,382 @@
+import array
+import collections
+import math
+import mmap
+import os
+import struct
+import weakref
+from settings import *
+
+
+def is_symmetric(matrix):
+    """Determines if every distance in a square matrix is the same in both directions. O(N^2)."""
+    return all(matrix[row][column] == matrix[column][row] for row in range(len(matrix)) for column in range(row))
+
+
+class DenseDistances:
+    """This is the distance source that holds the full distance matrix in memory as a list of lists. Row is the start
+    address and column is the end address, so one-way distances are kept as they are."""
+    def __init__(self, matrix, symmetric=None):
+        """Initialize distance source variables. Symmetry is detected when it is not given."""
+        self.matrix = matrix  # Perfect square matrix of distances.
+        self.symmetric = is_symmetric(matrix) if symmetric is None else symmetric  # Distances match both ways.
+
+    def __len__(self):
+        """Return number of address indexes. O(1)."""
+        return len(self.matrix)
+
+    def __getitem__(self, row):
+        """Return the row of distances from one address index to every address index. O(1)."""
+        return self.matrix[row]
+
+    def distance(self, start, end):
+        """Return the distance from one address index to another. O(1)."""
+        return self.matrix[start][end]
+
+    def submatrix(self, addresses):
+        """Return the distances between a list of address indexes, in list order. O(K^2)."""
+        return [[row[column] for column in addresses] for row in (self.matrix[index] for index in addresses)]
+
+
+class MappedDistances:
+    """This is the distance source that reads a dense float32 matrix file from disk. Rows are read one page at a time
+    through a memory map and only a bounded number of rows are kept in memory, so the matrix never has to fit in RAM.
+
+    The file begins with a header containing a magic string, the address count, and the checksum of the distance
+    file it was built from. The header is followed by N * N float32 values in row order. The magic string also records
+    whether the matrix is symmetric."""
+    HEADER = struct.Struct('<4sI40s')  # Magic string, address count, distance file checksum.
+    MAGIC = b'TSPD'  # Matrix with one-way distances, or of unknown symmetry.
+    SYMMETRIC_MAGIC = b'TSPS'  # Symmetric matrix.
+
+    def __init__(self, file_name, page_rows=DISTANCE_PAGE_ROWS, cache_rows=DISTANCE_CACHE_ROWS):
+        """Initialize distance source variables and open the memory map."""
+        self.file_name = file_name  # Path of the float32 matrix file.
+        self.page_rows = page_rows  # Rows read from disk at once.
+        self.cache_rows = max(cache_rows, page_rows)  # Maximum rows held in memory.
+        self.rows = collections.OrderedDict()  # Least recently used row cache.
+        self.size = 0  # Number of address indexes.
+        self.checksum = None  # Checksum of the distance file the matrix was built from.
+        self.symmetric = False  # Distances match both ways. Read from the header.
+        self.file = None
+        self.map = None
+        self.open()
+
+    def __len__(self):
+        """Return number of address indexes. O(1)."""
+        return self.size
+
+    def __getitem__(self, row):
+        """Return the row of distances from one address index to every address index. O(1) when cached."""
+        try:
+            self.rows.move_to_end(row)
+            return self.rows[row]
+        except KeyError:
+            self.read_page(row)
+            return self.rows[row]
+
+    def __getstate__(self):
+        """Memory maps cannot be pickled. Only the file settings are sent to other processes. O(1)."""
+        return {'file_name': self.file_name, 'page_rows': self.page_rows, 'cache_rows': self.cache_rows}
+
+    def __setstate__(self, state):
+        """Reopens the memory map in the receiving process. O(1)."""
+        self.__init__(state['file_name'], state['page_rows'], state['cache_rows'])
+
+    def distance(self, start, end):
+        """Return the distance from one address index to another. O(1) when cached."""
+        return self[start][end]
+
+    def submatrix(self, addresses):
+        """Return the distances between a list of address indexes, in list order. O(K^2) when cached."""
+        return [[row[column] for column in addresses] for row in (self[index] for index in addresses)]
+
+    def open(self):
+        """Opens the matrix file, validates the header, and maps the file into memory. O(1)."""
+        self.file = open(self.file_name, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size, checksum = self.HEADER.unpack_from(self.map, 0)
+        if magic not in (self.MAGIC, self.SYMMETRIC_MAGIC) or \
+                len(self.map) != self.HEADER.size + self.size * self.size * 4:
+            self.close()
+            raise ValueError("Distance map file is damaged: " + self.file_name)
+        self.checksum = checksum.decode()
+        self.symmetric = magic == self.SYMMETRIC_MAGIC
+
+    def close(self):
+        """Releases the memory map and the file handle. O(1)."""
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def read_page(self, row):
+        """Reads the page of rows that contains row into the row cache. Evicts the oldest rows over the limit.
+        O(N * P)."""
+        first = row - row % self.page_rows
+        last = min(first + self.page_rows, self.size)
+        row_bytes = self.size * 4
+        for index in range(first, last):
+            if index in self.rows:
+                continue
+            start = self.HEADER.size + index * row_bytes
+            values = array.array('f')
+            values.frombytes(self.map[start:start + row_bytes])
+            self.rows[index] = values
+        self.rows.move_to_end(row)
+        while len(self.rows) > self.cache_rows:
+            self.rows.popitem(last=False)
+
+    @classmethod
+    def matches(cls, file_name, checksum):
+        """Returns True if the matrix file exists and was built from a distance file with this checksum. O(1)."""
+        try:
+            with open(file_name, 'rb') as file_python:
+                magic, size, stored = cls.HEADER.unpack(file_python.read(cls.HEADER.size))
+        except (OSError, struct.error):
+            return False
+        return magic in (cls.MAGIC, cls.SYMMETRIC_MAGIC) and stored.decode() == checksum
+
+    @classmethod
+    def write(cls, file_name, size, rows, checksum, symmetric=None):
+        """Writes rows of distances to a matrix file one row at a time. rows yields N sequences of floats. A row of a
+        lower triangle file holds only the distances up to its diagonal. Once every row is written, the missing
+        distances are copied from the columns below the diagonal through a memory map of the file, so neither triangle
+        is ever held in memory. Symmetry is checked the same way when it is not given. O(N^2)."""
+        with open(file_name + '.tmp', 'w+b') as file_python:
+            file_python.write(cls.HEADER.pack(cls.MAGIC, size, checksum.encode()))
+            triangle = False
+            for row in rows:
+                values = array.array('f', row)
+                if len(values) < size:
+                    triangle = True
+                    values.extend([0.0] * (size - len(values)))
+                file_python.write(values.tobytes())
+            file_python.flush()
+            with mmap.mmap(file_python.fileno(), 0) as mapped:
+                with memoryview(mapped) as whole, whole[cls.HEADER.size:].cast('f') as view:
+                    # Row x right of the diagonal is column x below the diagonal.
+                    for x in range(size):
+                        right, below = slice(x * size + x + 1, (x + 1) * size), slice((x + 1) * size + x, None, size)
+                        if triangle:
+                            view[right] = view[below]
+                        elif symmetric is None and view[right].tolist() != view[below].tolist():
+                            symmetric = False
+                if triangle or symmetric is not False:
+                    mapped[:len(cls.SYMMETRIC_MAGIC)] = cls.SYMMETRIC_MAGIC
+        os.replace(file_name + '.tmp', file_name)
+
+
+class CoordinateDistances:
+    """This is the distance source that computes distances on demand from address coordinates. Computed rows are kept
+    in a bounded least recently used cache, so memory is fixed no matter how many addresses exist. Straight-line
+    distances are the same both ways, so the source is always symmetric."""
+    def __init__(self, coordinates, scale=COORDINATE_SCALE, cache_rows=DISTANCE_CACHE_ROWS):
+        """Initialize distance source variables."""
+        self.coordinates = coordinates  # List of (x, y) pairs, one for each address index.
+        self.scale = scale  # Multiplier from straight-line distance to road miles.
+        self.symmetric = True  # Distances match both ways.
+        self.cache_rows = cache_rows  # Maximum rows held in memory.
+        self.rows = collections.OrderedDict()  # Least recently used row cache.
+
+    def __len__(self):
+        """Return number of address indexes. O(1)."""
+        return len(self.coordinates)
+
+    def __getitem__(self, row):
+        """Return the row of distances from one address index to every address index. O(1) when cached."""
+        try:
+            self.rows.move_to_end(row)
+            return self.rows[row]
+        except KeyError:
+            pass
+        x, y = self.coordinates[row]
+        values = array.array('f', [round(math.hypot(x - a, y - b) * self.scale, 1) for a, b in self.coordinates])
+        self.rows[row] = values
+        if len(self.rows) > self.cache_rows:
+            self.rows.popitem(last=False)
+        return values
+
+    def distance(self, start, end):
+        """Return the distance from one address index to another without touching the row cache. O(1)."""
+        if start in self.rows:
+            return self.rows[start][end]
+        x, y = self.coordinates[start]
+        a, b = self.coordinates[end]
+        return round(math.hypot(x - a, y - b) * self.scale, 1)
+
+    def submatrix(self, addresses):
+        """Return the distances between a list of address indexes, in list order. Rows are computed only for the
+        listed columns and are not cached. O(K^2)."""
+        return [[self.distance(row, column) for column in addresses] for row in addresses]
+
+    @classmethod
+    def from_file(cls, file_name):
+        """Reads a coordinate file with one 'address index,x,y' line per address. O(N)."""
+        coordinates = []
+        with open(file_name) as file_python:
+            for line in file_python:
+                fields = line.strip().split(',')
+                if len(fields) < 3:
+                    continue
+                try:
+                    coordinates.append((int(fields[0]), float(fields[1]), float(fields[2])))
+                except ValueError:
+                    continue  # Skips header lines.
+        coordinates.sort()
+        return cls([(x, y) for _, x, y in coordinates])
+
+
+class SharedDistances:
+    """This is the distance source that holds the full distance matrix in a shared memory block, as a flat array of
+    doubles in row order. The process that publishes the matrix owns the block. A worker process attaches to the block
+    by name when the source is unpickled and reads rows through zero-copy views, so only the block name is sent to a
+    worker, however large the matrix is.
+
+    The owner unlinks the block when the source is closed, garbage collected, or when the interpreter exits, including
+    after an uncaught exception or a keyboard interrupt. If the owner is killed, the multiprocessing resource tracker
+    it started unlinks the block. Workers share the owner's resource tracker and never unlink the block."""
+    def __init__(self, memory, size, symmetric, owner=False):
+        """Initialize distance source variables. Use publish to create the block."""
+        self.memory = memory  # Shared memory block.
+        self.size = size  # Number of address indexes.
+        self.symmetric = symmetric  # Distances match both ways.
+        self.owner = owner  # Unlinks the block when released.
+        self.view = memory.buf.cast('d')  # Flat view of the block as doubles.
+        self.finalizer = weakref.finalize(self, release_shared, memory, self.view, owner)  # Releases the block once.
+
+    def __len__(self):
+        """Return number of address indexes. O(1)."""
+        return self.size
+
+    def __getitem__(self, row):
+        """Return the row of distances from one address index to every address index as a zero-copy view. O(1)."""
+        return self.view[row * self.size:(row + 1) * self.size]
+
+    def __getstate__(self):
+        """Only the block name is sent to other processes. O(1)."""
+        return {'name': self.memory.name, 'size': self.size, 'symmetric': self.symmetric}
+
+    def __setstate__(self, state):
+        """Attaches to the block in the receiving process. O(1)."""
+        from multiprocessing import shared_memory
+        self.__init__(shared_memory.SharedMemory(name=state['name']), state['size'], state['symmetric'])
+
+    def distance(self, start, end):
+        """Return the distance from one address index to another. O(1)."""
+        return self.view[start * self.size + end]
+
+    def submatrix(self, addresses):
+        """Return the distances between a list of address indexes, in list order. O(K^2)."""
+        view, size = self.view, self.size
+        return [[view[row * size + column] for column in addresses] for row in addresses]
+
+    def close(self):
+        """Releases the view, and unlinks the block if this process owns it. O(1)."""
+        self.finalizer()
+
+    @classmethod
+    def publish(cls, source):
+        """Copies a distance source into a new shared memory block one row at a time, and returns the owning source.
+        Raises ImportError before Python 3.8, which has no shared memory blocks. O(N^2)."""
+        from multiprocessing import shared_memory
+        size = len(source)
+        memory = shared_memory.SharedMemory(create=True, size=max(1, size * size) * 8)
+        try:
+            view = memory.buf.cast('d')
+            for row in range(size):
+                view[row * size:(row + 1) * size] = array.array('d', source[row])
+            view.release()
+        except BaseException:
+            memory.close()
+            memory.unlink()
+            raise
+        return cls(memory, size, getattr(source, 'symmetric', False), owner=True)
+
+
+def release_shared(memory, view, owner):
+    """Releases a shared memory view and closes the block. The owner also unlinks the block. Rows still referenced
+    elsewhere keep the mapping open in this process, but the block is unlinked all the same. O(1)."""
+    try:
+        view.release()
+        memory.close()
+    except BufferError:
+        pass
+    if owner:
+        try:
+            memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SubsetDistances:
+    """This is the distance source that holds the distances between a subset of address indexes, such as the addresses
+    served by one hub. Only K * K distances are kept for K addresses, and address indexes stay the same as in the full
+    distance source. The full distance source is not pickled, so a subset is cheap to send to another process. Once the
+    full source is shared, the shared source is sent instead of the subset matrix, and other processes read distances
+    from the shared block."""
+    def __init__(self, source, addresses):
+        """Initialize distance source variables."""
+        self.source = source  # Full distance source. Not sent to other processes.
+        self.size = len(source)  # Number of address indexes in the full distance source.
+        self.symmetric = getattr(source, 'symmetric', False)  # Distances match both ways, as in the full source.
+        self.index = {}  # Key = address index; Value = position in the subset matrix.
+        self.matrix = []  # Distances between subset addresses, in position order. None where read from shared memory.
+        self.shared = None  # Shared memory copy of the full distance source. Sent to other processes when set.
+        self.add(addresses)
+
+    def __len__(self):
+        """Return number of address indexes in the full distance source. O(1)."""
+        return self.size
+
+    def __contains__(self, address):
+        """Determines if an address index is in the subset. O(1)."""
+        return address in self.index
+
+    def __getitem__(self, row):
+        """Return the full row of distances from the full distance source. O(1) when the source is available."""
+        if self.source is None:
+            raise KeyError("Full distance rows are not available in this process: " + str(row))
+        return self.source[row]
+
+    def __getstate__(self):
+        """Drops the full distance source before pickling. A shared source replaces both the full source and the
+        subset matrix, so only the address index is copied. O(K)."""
+        state = self.__dict__.copy()
+        state['source'] = self.shared
+        if self.shared is not None:
+            state['matrix'] = None
+        return state
+
+    def distance(self, start, end):
+        """Return the distance from one subset address index to another. O(1)."""
+        if self.matrix is None:
+            return self.source.distance(start, end)
+        return self.matrix[self.index[start]][self.index[end]]
+
+    def submatrix(self, addresses):
+        """Return the distances between a list of subset address indexes, in list order. O(K^2)."""
+        if self.matrix is None:
+            return self.source.submatrix(addresses)
+        positions = [self.index[address] for address in addresses]
+        return [[row[column] for column in positions] for row in (self.matrix[position] for position in positions)]
+
+    def add(self, addresses):
+        """Adds address indexes to the subset, reading their distances from the full distance source. O(K^2)."""
+        new = [address for address in dict.fromkeys(addresses) if address not in self.index]
+        if not new:
+            return
+        for address in new:
+            self.index[address] = len(self.index)
+        if self.matrix is None:
+            return
+        addresses = list(self.index)
+        # Extends existing rows with the new columns, then appends the new rows.
+        for address, row in zip(addresses, self.matrix):
+            source_row = self.source[address]
+            row.extend(source_row[column] for column in new)
+        for address in new:
+            source_row = self.source[address]
+            self.matrix.append(array.array('d', [source_row[column] for column in addresses]))
@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+import os
+from settings import *
+
+
+# Event kinds.
+LOAD = 'load'  # Packages were loaded onto a truck at the hub.
+DEPART = 'depart'  # Truck departed the hub with its route.
+DELIVER = 'deliver'  # Truck delivered packages at an address.
+ARRIVE_HUB = 'arrive-hub'  # Truck arrived back at the hub.
+SPECIAL = 'special'  # Delayed packages arrived or bad addresses were fixed.
+
+FIELDS = ['time', 'seconds', 'event', 'truck', 'address', 'packages', 'miles', 'detail']
+
+
+class EventSink:
+    """This is the event sink class that streams machine-readable simulation events to a file or pipe. Each event is
+    one line of JSON or one CSV row with the fields in FIELDS. Events are kept as tuples in a buffer and are formatted
+    and written in batches, so an event costs one append in the simulation loop. A regular file is rotated when it
+    grows past the rotation size: the file is renamed with a .1 suffix, older files move up one number, and only the
+    newest EVENT_ROTATE_COUNT files are kept."""
+    def __init__(self, file_name, kind=EVENT_FORMAT, batch=EVENT_BATCH, rotate_bytes=EVENT_ROTATE_BYTES,
+                 rotate_count=EVENT_ROTATE_COUNT):
+        """Initialize sink variables and open the output."""
+        if kind not in ('ndjson', 'csv'):
+            raise ValueError("Event format must be 'ndjson' or 'csv': " + str(kind))
+        self.file_name = file_name  # Path of the output file or pipe.
+        self.kind = kind  # Output format. Either 'ndjson' or 'csv'.
+        self.batch = batch  # Events buffered before they are written.
+        self.rotate_bytes = rotate_bytes  # File size that triggers a rotation. Zero disables rotation.
+        self.rotate_count = rotate_count  # Rotated files kept.
+        self.buffer = []  # Events waiting to be written.
+        self.written = 0  # Bytes written to the current file.
+        self.file = None
+        self.open()
+
+    def open(self):
+        """Opens the output. Pipes and other special files are never rotated. O(1)."""
+        self.file = open(self.file_name, 'a', newline='')
+        self.written = self.file.tell() if self.file.seekable() else 0
+        if not os.path.isfile(self.file_name):
+            self.rotate_bytes = 0
+        if self.kind == 'csv' and self.written == 0:
+            self.file.write(','.join(FIELDS) + '\r\n')
+
+    def emit(self, sim, event, truck=None, address=None, packages=(), detail=""):
+        """Adds an event to the buffer. Writes the buffer once it holds a full batch. O(1) amortized."""
+        self.buffer.append((str(sim.time).strip(), sim.time.total_seconds(), event,
+                            truck.identifier if truck else None, address, tuple(packages),
+                            round(truck.miles, 2) if truck else None, detail))
+        if len(self.buffer) >= self.batch:
+            self.flush()
+
+    def loaded(self, sim, truck):
+        """Adds the load and depart events for a truck leaving the hub. O(N)."""
+        self.emit(sim, LOAD, truck, truck.current, truck.package_ids)
+        self.emit(sim, DEPART, truck, truck.current, detail=' '.join(str(x) for x in truck.locations))
+
+    def delivered(self, sim, truck):
+        """Adds the deliver or arrive-hub event for a truck that reached an address. O(N)."""
+        if truck.available and truck.current == truck.home:
+            self.emit(sim, ARRIVE_HUB, truck, truck.current)
+        else:
+            self.emit(sim, DELIVER, truck, truck.current, [int(package_id) for package_id in truck.unload_ids])
+
+    def special(self, sim, detail):
+        """Adds a special event. O(1)."""
+        self.emit(sim, SPECIAL, detail=detail)
+
+    def format(self, records):
+        """Returns buffered events as text. O(E)."""
+        if self.kind == 'ndjson':
+            return ''.join(json.dumps(dict(zip(FIELDS, record))) + '\n' for record in records)
+        text = io.StringIO()
+        writer = csv.writer(text)
+        for record in records:
+            writer.writerow(record[:5] + (' '.join(str(x) for x in record[5]),) + record[6:])
+        return text.getvalue()
+
+    def flush(self):
+        """Writes every buffered event, then rotates the file if it is too large. O(E)."""
+        if not self.buffer or self.file is None:
+            return
+        text = self.format(self.buffer)
+        self.buffer = []
+        self.file.write(text)
+        self.file.flush()
+        self.written = self.written + len(text)
+        if self.rotate_bytes and self.written >= self.rotate_bytes:
+            self.rotate()
+
+    def rotate(self):
+        """Closes the current file, renames it and the older files, and opens a new file. O(R)."""
+        self.file.close()
+        for number in range(self.rotate_count - 1, 0, -1):
+            older = "%s.%d" % (self.file_name, number)
+            if os.path.exists(older):
+                os.replace(older, "%s.%d" % (self.file_name, number + 1))
+        if self.rotate_count:
+            os.replace(self.file_name, self.file_name + ".1")
+        else:
+            os.remove(self.file_name)
+        self.open()
+
+    def close(self):
+        """Writes every buffered event and closes the output. O(E)."""
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
@@ -1,6 +1,19 @@
 # Made by Ryan Kruse.
-from objects import Truck, HashTable, Clock, Hub
+import time
+STARTED = time.perf_counter()  # Start of module import. Used to measure start-up time.
+import argparse
+import contextlib
+import csv
+import datetime
+import hashlib
+import heapq
+import json
+import os
+import random
+from distances import DenseDistances, MappedDistances, CoordinateDistances
+from objects import Fleet, Truck, HashTable, PackageArchive, PackageGroups, Clock, Hub
 from settings import *
+from timing import SpeedProfile
 
 
 class Simulation:
@@ -9,20 +22,43 @@ class Simulation:
         """Initialize simulation variables."""
         self.prepper = prep  # Reference to prepper.
         self.index_addresses = {v: k for k, v in prep.address_dictionary.items()}  # Dictionary of addresses.
-        self.distances = prep.distance_matrix  # Distance matrix table.
+        self.distances = prep.distances  # Distance source for the distance matrix table.
         self.packages = prep.package_table  # Package table.
         self.hash_table = HashTable(len(self.packages) + 1)  # Package hash table.
+        self.archive = None  # Records of delivered packages moved out of the hash table. Opened on first use.
         self.construct()  # Constructs hash table.
-        self.time = Clock(0, 0, 0)  # Constructs clock object.
-        self.hub = Hub(self, self.packages)  # Constructs Hub object.
-        self.truck_1 = Truck(self, 1, True, True, 41)  # Constructs truck 1 object.
-        self.truck_2 = Truck(self, 2, False, False, 149)  # Constructs truck 2 object.
+        self.time = Clock()  # Constructs clock object.
+        self.flight_delay_time = Clock.parse(FLIGHT_DELAY_TIME)  # Seconds when delayed packages arrive.
+        self.bad_address_time = Clock.parse(BAD_ADDRESS_TIME)  # Seconds when bad addresses are fixed.
+        self.day_end_time = Clock.parse(DAY_END_TIME)  # Seconds when trucks stop being loaded for the day.
+        self.day = 0  # Day of a rolling multi-day simulation. The first day is 0.
+        self.days = 1  # Number of days simulated.
+        self.day_reports = []  # One summary per finished day of a rolling multi-day simulation.
+        self.profile = SpeedProfile()  # Truck speed over the day. Turns route miles into arrival seconds.
+        self.hubs = [Hub(self, packages, depot)
+                     for depot, packages in self.assign_depots(self.packages).items()]  # Hub objects.
+        self.fleet = Fleet()  # Moving state of every truck.
+        self.truck_1 = Truck(self, 1, True, True, 41, TRUCK_DEPOTS[1], TRUCK_WEIGHT_LIMITS[1])  # Constructs truck 1.
+        self.truck_2 = Truck(self, 2, False, False, 149, TRUCK_DEPOTS[2], TRUCK_WEIGHT_LIMITS[2])  # Constructs truck 2.
+        for truck in [self.truck_1, self.truck_2]:
+            truck.hub = next(hub for hub in self.hubs if hub.depot == truck.home)
+        self.executor = None  # Process pool that plans loads for separate Hubs in parallel.
+        self.shared = None  # Shared memory copy of the distance matrix for worker processes. Published on first use.
         self.trucks = []  # All trucks.
         self.newline = "\n\n\n\n\n\n"  # Buffer space for printing text.
         self.gui_commands = ['Q', 'W', 'E', 'A', 'S', 'D']  # All GUI Commands.
         self.end = False  # GUI check if executing all code.
         self.event = True  # GUI check if event occurred.
         self.loop = False  # GUI check if simulation complete.
+        self.headless = False  # Runs without GUI inputs and stops once the simulation is complete.
+        self.finished = False  # Records if all packages are delivered.
+        self.recorder = None  # Writes the event log and checkpoints when set.
+        self.replayer = None  # Applies logged loads instead of solving routes when set.
+        self.sink = None  # Streams delivery events when set.
+        self.solver = None  # Splits large exact route solves across processes. Started on first use.
+        if EVENT_FILE:
+            from events import EventSink
+            self.sink = EventSink(EVENT_FILE)
 
     def __str__(self):
         """This prints valuable information about the state of the entire simulation. For simplicity sake, the
@@ -190,9 +226,9 @@ class Simulation:
             buffer = buffer + token
         return buffer
 
-    def construct(self):
+    def construct(self, packages=None):
         """Constructs hash table with keys as ID and data as package information. Updates statuses. O(N)."""
-        for package in self.prepper.package_table[:]:
+        for package in (self.prepper.package_table if packages is None else packages)[:]:
             package_data = []
             # Select data elements to store into hash table data.
             for index in [0, 1, 2, 4, 5, 6, 8]:
@@ -207,17 +243,42 @@ class Simulation:
             # Put data into hash table. Package ID is key.
             self.hash_table[int(package[0])] = package_data
 
+    @property
+    def neighbors(self):
+        """Nearest address indexes for each address index. Built on first access. O(1) after the first access."""
+        return self.prepper.neighbor_lists
+
     def execute(self):
         """Runs entire simulation."""
         self.setup()
-        while True:
-            self.gui()
-            self.time.tick_second()
-            self.special()
-            for truck in self.trucks:
-                self.drive(truck)
-                self.load(truck)
-                self.deliver(truck)
+        while not self.finished:
+            self.step()
+
+    def step(self, seconds=1):
+        """Runs one simulation tick. A tick is 1 second unless told otherwise. O(M * N!)."""
+        self.gui()
+        self.time.tick_second(seconds)
+        self.special()
+        self.load_trucks()
+        for truck in self.fleet.arrivals(self.time.seconds):
+            self.deliver(truck)
+        if self.recorder:
+            self.recorder.tick(self)
+
+    def fast_forward(self, seconds):
+        """Runs the simulation without GUI inputs or prints until the clock reaches seconds since midnight."""
+        end, event = self.end, self.event
+        self.end = True
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            while self.time.total_seconds() < seconds and not self.finished:
+                self.step()
+        self.end, self.event = end, event
+
+    def run_headless(self):
+        """Ignores all GUI inputs. The simulation stops once all packages are delivered instead of looping GUI inputs.
+        O(1)."""
+        self.headless = True
+        self.end = True
 
     def setup(self):
         """Set simulation time. Create truck list. Print simulation. O(N)."""
@@ -229,33 +290,212 @@ class Simulation:
     def special(self):
         """Check for special events that impact the simulation. O(N^2)."""
         # Packages arrive from airport.
-        if self.time.compare_time(FLIGHT_DELAY_TIME):
-            self.hub.flight_arrival()
+        if self.time.compare_time(self.flight_delay_time):
+            for hub in self.hubs:
+                hub.flight_arrival()
+            if self.sink:
+                self.sink.special(self, "Delayed packages arrived")
         # Packages with bad addresses are fixed.
-        elif self.time.compare_time(BAD_ADDRESS_TIME):
-            self.hub.address_fixed()
+        elif self.time.compare_time(self.bad_address_time):
+            for hub in self.hubs:
+                hub.address_fixed()
+            if self.sink:
+                self.sink.special(self, "Bad addresses fixed")
+        # The day is over, and another day follows.
+        elif self.day + 1 < self.days and self.day_over():
+            self.next_day()
         # All packages are confirmed delivered.
-        elif not self.hub.warehouse and not self.hub.do_not_ship_packages and \
+        elif all(not hub.warehouse and not hub.do_not_ship_packages for hub in self.hubs) and \
                 not self.truck_1.package_ids and not self.truck_2.package_ids:
             self.complete()
 
+    def run_days(self, days):
+        """Runs a rolling simulation of several days. Each day ends once every truck is parked and either every
+        package is delivered or the day end time has passed. Packages that are not delivered carry over to the next
+        day. O(1)."""
+        self.days = days
+
+    def day_over(self):
+        """Determines if every truck is parked and the Hubs are empty or the day end time has passed. O(T + D)."""
+        if any(truck.locations for truck in self.trucks):
+            return False
+        if self.time.total_seconds() >= self.day_end_time:
+            return True
+        return all(not hub.warehouse and not hub.do_not_ship_packages for hub in self.hubs)
+
+    def next_day(self):
+        """Starts the next day of a rolling simulation. Trucks that ended away from their Hub drive back overnight and
+        are reset. The event times move forward one day and the day's dated package batch is received. Undelivered
+        packages stay in their Hub. Caches such as the distance source, neighbor lists, and subset matrices are kept.
+        O(N^2)."""
+        delivered = [x for x in self.packages if self.package_record(int(x[0]))[-1].startswith("Delivered")]
+        self.packages = [x for x in self.packages if not self.package_record(int(x[0]))[-1].startswith("Delivered")]
+        self.day_reports.append({'day': self.day, 'finished': str(self.time).strip(), 'delivered': len(delivered),
+                                 'carried': len(self.packages), 'miles': sum(truck.miles for truck in self.trucks)})
+        self.day = self.day + 1
+        for truck in self.trucks:
+            if truck.current != truck.home:
+                truck.miles = truck.miles + self.distances.distance(truck.current, truck.home)
+                truck.current = truck.home
+            truck.available = truck.start_available
+            truck.breaks_taken = 0
+        self.flight_delay_time = self.flight_delay_time + 86400
+        self.bad_address_time = self.bad_address_time + 86400
+        self.day_end_time = self.day_end_time + 86400
+        self.time.set_seconds(Clock.parse(SIMULATION_START_TIME) + self.day * 86400)
+
+        # Receives the day's packages. Package IDs continue from the highest ID so far.
+        date = datetime.date.fromisoformat(DAILY_START_DATE) + datetime.timedelta(days=self.day)
+        file_name = DAILY_PACKAGE_FILE % date.isoformat()
+        if os.path.exists(file_name):
+            first_id = max([int(slot) for slot, _ in self.package_records()] + [0]) + 1
+            batch = self.prepper.read_package_batch(file_name, first_id)
+            self.construct(batch)
+            for depot, packages in self.assign_depots(batch).items():
+                next(hub for hub in self.hubs if hub.depot == depot).receive(packages)
+            self.packages = self.packages + batch
+        print(self.newline + "NEW DAY: " + date.isoformat() + " -" + str(self.time) + ".\n" + str(self))
+        self.event = True
+
+    def assign_depots(self, packages):
+        """Assigns every package to the Hub closest to its address. Only Hubs that a truck works from are candidates, so
+        no package waits at a Hub that is never loaded. A package addressed to a Hub is assigned to the closest other
+        Hub, because routes never stop at their own Hub. Packages that must be delivered together are assigned as one,
+        to the Hub closest to all of their addresses. A package that must ship on a specific truck takes its group to
+        that truck's Hub. Returns the packages for each Hub. O(N * D)."""
+        depots = {depot: [] for depot in DEPOT_ADDRESSES}
+        served = [depot for depot in DEPOT_ADDRESSES if depot in set(TRUCK_DEPOTS.values())]
+        rows = {depot: self.distances[depot] for depot in served}
+        groups = self.prepper.package_groups
+        units = {}  # Key = root package ID of a group, or the package ID; Value = packages assigned together.
+        for package in packages:
+            units.setdefault(groups.find(package[0]) if package[0] in groups else package[0], []).append(package)
+        assigned = {}  # Key = root package ID of a group, or the package ID; Value = address ID of the Hub.
+        for key, unit in units.items():
+            addresses = {package[-1] for package in unit}
+            if any(package[7] == "Truck 2" for package in unit):
+                assigned[key] = TRUCK_DEPOTS[2]
+            else:
+                candidates = [depot for depot in served if depot not in addresses] or served
+                assigned[key] = min(candidates, key=lambda x: sum(rows[x][address] for address in addresses))
+        for package in packages:
+            depots[assigned[groups.find(package[0]) if package[0] in groups else package[0]]].append(package)
+        return depots
+
+    def load_trucks(self):
+        """Load every truck that is available in a Hub with packages. When trucks are waiting at more than one Hub, one
+        truck per Hub is planned at a time in separate processes. Recorded and replayed runs plan in order, one truck at
+        a time, so the random sequence can be reproduced. O(M * N!)."""
+        # Trucks are not loaded after the day end time, unless it is the last day.
+        if self.day + 1 < self.days and self.time.total_seconds() >= self.day_end_time:
+            return
+        # Trucks are only loaded during their driver's shift. Shifts do not end on the last day, so every package is
+        # still delivered.
+        second, last_day = self.time.total_seconds() - self.day * 86400, self.day + 1 == self.days
+        ready = [truck for truck in self.trucks if truck.available and truck.current == truck.home and
+                 truck.hub.warehouse and truck.on_shift(second, last_day)]
+        if DEPOT_WORKERS < 2 or self.recorder or self.replayer or len({truck.home for truck in ready}) < 2:
+            for truck in ready:
+                self.load(truck)
+            return
+        while ready:
+            # Take one truck from each Hub. Trucks sharing a Hub are planned in later rounds.
+            batch = list({truck.home: truck for truck in reversed(ready)}.values())
+            ready = [truck for truck in ready if truck not in batch]
+            self.load_parallel(batch)
+
+    def load_parallel(self, batch):
+        """Plans loads for trucks at separate Hubs in parallel, then loads each truck with its plan. O(M * N!)."""
+        if self.executor is None:
+            self.share_distances()
+            import concurrent.futures
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=DEPOT_WORKERS)
+        futures = []
+        for truck in batch:
+            truck.hub.truck_last_trip(truck)
+            futures.append(self.executor.submit(truck.hub.plan_truck, truck, random.getrandbits(32)))
+        for truck, future in zip(batch, futures):
+            ids, route = future.result()
+            truck.hub.load_planned(truck, ids, route[0], route[1], route[2])
+
+    def share_distances(self):
+        """Publishes the distance matrix to shared memory once, so every Hub sent to a worker process carries the
+        block name instead of its distances. Without shared memory, Hubs carry their distances as before. O(N^2) on the
+        first call, O(1) after."""
+        if not SHARED_DISTANCES or self.shared is not None:
+            return
+        from distances import SharedDistances
+        try:
+            self.shared = SharedDistances.publish(self.distances)
+        except ImportError:
+            return
+        for hub in self.hubs:
+            hub.distances.shared = self.shared
+
+    def solve_workers(self):
+        """Returns the number of processes available to one exact route solve. O(1)."""
+        return SOLVE_WORKERS or os.cpu_count() or 1
+
+    def branch_solver(self):
+        """Returns the branch solver, starting it on first use. O(1)."""
+        if self.solver is None:
+            from solver import BranchSolver
+            self.solver = BranchSolver(self.solve_workers())
+        return self.solver
+
     def load(self, truck):
         """Load truck in Hub if truck is available and located in Hub. O(M * N!)."""
-        if truck.available and truck.current == 0:
-            self.hub.load_truck(truck)
-
-    def drive(self, truck):
-        """Drive the truck one second. O(1)."""
-        if truck.locations:
-            truck.drive()
+        if truck.available and truck.current == truck.home:
+            if self.replayer is None or not self.replayer.load(self, truck):
+                if self.recorder:
+                    self.recorder.before_load(self, truck)
+                truck.hub.load_truck(truck)
+            if self.recorder:
+                self.recorder.after_load(self, truck)
 
     def deliver(self, truck):
         """Deliver packages from truck if truck arrives at package location. O(N^2)."""
-        if truck.next_distance <= 0 and truck.locations:
+        if truck.arrival <= self.time.seconds and truck.locations:
             truck.deliver_package()  # Deliver package. If truck arrives at hub, this step is ignored.
             truck.next_address()  # Check for next address to drive to. If none, checks if truck in HUB.
+            if self.recorder:
+                self.recorder.delivered(self, truck)
+            if self.sink:
+                self.sink.delivered(self, truck)
+            self.archive_delivered(truck.unload_ids)
             truck.print_simulation()  # Print simulation and wait for GUI command.
 
+    def archive_delivered(self, package_ids):
+        """Moves the records of delivered packages from the hash table to the package archive, so the hash table holds
+        only packages that are not delivered yet. Recorded and replayed runs keep every record in the hash table,
+        because checkpoints save the hash table. Each record is written to the archive before it leaves the hash table,
+        so a query from another thread always finds it in one of them. O(K)."""
+        if not ARCHIVE_DELIVERED or self.recorder or self.replayer or not package_ids:
+            return
+        if self.archive is None:
+            self.archive = PackageArchive()
+        for package_id in package_ids:
+            self.archive[int(package_id)] = self.hash_table[int(package_id)]
+            self.hash_table.remove(int(package_id))
+
+    def package_record(self, package_id):
+        """Returns the record of a package from the hash table or the package archive. None if the package ID is
+        unknown. O(1)."""
+        data = self.hash_table[package_id]
+        if data is None and self.archive is not None:
+            data = self.archive[package_id]
+        return data
+
+    def package_records(self):
+        """Yields every package ID and record from the hash table, then from the package archive. A package archived
+        while the hash table is read is yielded once. O(N)."""
+        seen = set()
+        for key, data in self.hash_table.items():
+            seen.add(key)
+            yield key, data
+        if self.archive is not None:
+            yield from ((key, data) for key, data in self.archive.items() if key not in seen)
+
     def gui(self):
         """User interface for interacting with the simulation. Contains binded key function calls. O(N)."""
         while (self.event and not self.end) or self.loop:
@@ -268,6 +508,8 @@ class Simulation:
                 # Prints package hash table.
                 elif command == 'W':
                     print(self.hash_table)
+                    if self.archive is not None:
+                        print(self.archive)
                 # Advances to the next event.
                 elif command == 'E':
                     self.event = False
@@ -293,7 +535,7 @@ class Simulation:
             try:
                 if int(package_id) > 0:
                     # Print package data.
-                    print("\t\t\t\t" + str(self.hash_table[int(package_id)]))
+                    print("\t\t\t\t" + str(self.package_data(int(package_id))))
             except (ValueError, KeyError, TypeError, IndexError):
                 pass
 
@@ -309,21 +551,75 @@ class Simulation:
             try:
                 if 0 <= int(address_id) <= len(self.index_addresses) - 1:
                     # Print address ID and address name.
-                    print("\t\t\t\t  " + address_id + " --> " + str(self.index_addresses[int(address_id)]), end='')
+                    address, package_list = self.address_data(int(address_id))
+                    print("\t\t\t\t  " + address_id + " --> " + str(address), end='')
                     # Print package IDs that are being delivered to address ID.
-                    if int(address_id) == 0:
+                    if int(address_id) in DEPOT_ADDRESSES:
                         print("")
                     else:
-                        package_list = [x[0] for x in self.packages if x[-1] == int(address_id)]
                         print(" (Package " + str((', '.join(package_list))) + ")")
             except (ValueError, KeyError, TypeError, IndexError):
                 pass
 
+    def package_data(self, package_id):
+        """Returns package data for a package ID from the hash table. None if the package ID is unknown. Packages that
+        are not delivered yet end with their predicted delivery time. O(1) for loaded packages, O(N + T) for packages
+        in a Hub."""
+        data = self.package_record(package_id)
+        if data is None:
+            return None
+        eta = self.package_eta(package_id)
+        if eta is None:
+            return data
+        return data + ["ETA" + str(Clock(eta))]
+
+    def package_eta(self, package_id):
+        """Returns the predicted delivery second of an undelivered package, or None if there is no prediction.
+        O(T) for loaded packages, O(N + T) for packages in a Hub."""
+        for truck in self.trucks:
+            eta = truck.eta(package_id)
+            if eta is not None:
+                return eta
+        for hub in self.hubs:
+            eta = hub.package_eta(package_id)
+            if eta is not None:
+                return eta
+        return None
+
+    def address_data(self, address_id):
+        """Returns the address name and the package IDs being delivered to an address ID. O(N)."""
+        if address_id in DEPOT_ADDRESSES:
+            return self.index_addresses[address_id], []
+        return self.index_addresses[address_id], [x[0] for x in self.packages if x[-1] == address_id]
+
     def complete(self):
         """Prints simulation results once all packages are delivered. Accepts GUI inputs until terminated. O(1)."""
-        print("%sThe simulation has ended at%s with all packages delivered." % (self.newline, self.time))
+        parked = sum(len(hub.parked) for hub in self.hubs)
+        if parked:
+            print("%sThe simulation has ended at%s with every package delivered except %d parked at a Hub." %
+                  (self.newline, self.time, parked))
+        else:
+            print("%sThe simulation has ended at%s with all packages delivered." % (self.newline, self.time))
         print("The cumulative total miles driven is %0.4s miles.\n\nThis program was written by %s. \n(%s)\n" %
               (self.truck_1.miles + self.truck_2.miles, AUTHOR, GITHUB))
+        self.finished = True
+        if self.recorder:
+            self.recorder.close()
+        if self.sink:
+            self.sink.close()
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+        if self.shared:
+            for hub in self.hubs:
+                hub.distances.shared = None
+            self.shared.close()
+            self.shared = None
+        if self.solver:
+            self.solver.close()
+            self.solver = None
+        if self.headless:
+            return
         # Permanently loop GUI inputs.
         self.loop = True
         while self.loop:
@@ -342,12 +638,31 @@ class Simulation:
 
 class Prepper:
     """This is the prepper class that reads data from .csv files and cleans it up for the simulation."""
-    def __init__(self):
+    def __init__(self, distance_file=DISTANCE_FILE, package_file=PACKAGE_FILE):
         """Initializes all variables."""
+        self.distance_file = distance_file  # Path of the distance file.
+        self.package_file = package_file  # Path of the package file.
         self.temp = None  # File contents.
         self.address_dictionary = {}  # Key = Address String; Value = Address Index.
         self.distance_matrix = []  # Perfect square matrix of distances.
+        self.symmetric = True  # Distances match both ways. False once a full matrix with one-way distances is read.
+        self.distances = None  # Distance source used by the simulation. Dense, memory-mapped, or coordinate-based.
+        self._neighbor_lists = None  # Nearest address indexes for each address index, sorted by distance.
+        self.checksum = None  # Fingerprint of the distance file contents.
         self.package_table = []  # Nested lists of package data.
+        self.package_groups = PackageGroups()  # Packages that must be delivered together, by package ID.
+
+    @property
+    def neighbor_lists(self):
+        """Nearest address indexes for each address index. Loaded or built on first access, since only some route
+        engines use them. O(N^2) on the first access, O(1) after."""
+        if self._neighbor_lists is None:
+            self.make_neighbor_lists()
+        return self._neighbor_lists
+
+    @neighbor_lists.setter
+    def neighbor_lists(self, value):
+        self._neighbor_lists = value
 
     def execute(self):
         """Main functions executed."""
@@ -361,20 +676,41 @@ class Prepper:
 
     def make_distance_matrix(self):
         """Import the distance.csv file and build the address dictionary and distance matrix variables."""
-        self.open_file(DISTANCE_FILE)
+        if DISTANCE_SOURCE == 'mapped':
+            self.stream_distance_file()
+            self.make_distance_source()
+            return
+        self.open_file(self.distance_file)
+        self.checksum = hashlib.sha1(self.temp.encode()).hexdigest()
         self.clean_matrix_file()
         self.delete_lead_data("\n")
         self.delete_junk_data(",")
         self.clean_matrix_addresses()
         self.make_address_dictionary()
-        self.clean_matrix_elements()
-        self.split_matrix_elements()
-        self.transpose_matrix()
-        self.assign_matrix()
+        self.make_distance_source()
+
+    def make_distance_source(self):
+        """Builds the distance source selected in settings. The dense source builds the full matrix in memory. The
+        mapped source streams the matrix to a float32 file once and then reads it in pages. The coordinate source
+        computes distances from address coordinates and never reads the matrix elements. The mapped source is
+        written by stream_distance_file before this is called."""
+        if DISTANCE_SOURCE == 'coordinates':
+            self.temp = None
+            self.distances = CoordinateDistances.from_file(COORDINATE_FILE)
+            self.symmetric = True
+        elif DISTANCE_SOURCE == 'mapped':
+            self.distances = MappedDistances(DISTANCE_MAP_FILE)
+            self.symmetric = self.distances.symmetric
+        else:
+            self.clean_matrix_elements()
+            self.split_matrix_elements()
+            self.transpose_matrix()
+            self.assign_matrix()
+            self.distances = DenseDistances(self.distance_matrix, self.symmetric)
 
-    def make_package_table(self):
+    def make_package_table(self, file_name=None):
         """Import the packages.csv file and build the package table variable."""
-        self.open_file(PACKAGE_FILE)
+        self.open_file(file_name or self.package_file)
         self.clean_table_file()
         self.delete_lead_data("1")
         self.delete_junk_data("")
@@ -385,6 +721,21 @@ class Prepper:
         self.format_grouped_packages()
         self.format_address_index()
 
+    def read_package_batch(self, file_name, first_id):
+        """Reads a dated package file in the same format as the package file. Package IDs are renumbered to start at
+        first_id, so they stay unique across days. Returns the package table of the batch. O(N^3)."""
+        table, self.package_table = self.package_table, []
+        groups, self.package_groups = self.package_groups, PackageGroups()
+        self.make_package_table(file_name)
+        batch, self.package_table = self.package_table, table
+        batch_groups, self.package_groups = self.package_groups, groups
+        for package in batch:
+            package[0] = str(int(package[0]) + first_id - 1)
+        for members in batch_groups.groups():
+            for package_id in members[1:]:
+                self.package_groups.union(str(int(members[0]) + first_id - 1), str(int(package_id) + first_id - 1))
+        return batch
+
     def open_file(self, file_name):
         """Opens a .csv file and assigns the file contents to self.temp. O(1)."""
         with open(file_name) as file_python:
@@ -408,11 +759,12 @@ class Prepper:
             self.temp.remove(junk_string)
 
     def clean_matrix_addresses(self):
-        """Removes data column A. Address only needs street and zipcode. Assigns indexes 0 and 1 to be HUB. O(N^2)."""
+        """Removes data column A. Address only needs street and zipcode. Assigns index 0 to be HUB and keeps the
+        distances after the HUB label in index 1, which is only the diagonal in a lower triangle file. O(N^2)."""
         for index in range(len(self.temp) - 3, -1, -3):
             del self.temp[index]
         self.temp[0] = ' HUB'
-        self.temp[1] = ',0.0\n'
+        self.temp[1] = ',' + self.temp[1].split(',', 2)[2]
 
     def make_address_dictionary(self):
         """Builds address dictionary by popping addresses out. Key is the address; value is the index. O(N^2)."""
@@ -424,11 +776,13 @@ class Prepper:
             self.address_dictionary[address] = index
 
     def clean_matrix_elements(self):
-        """Cleans up the first and last characters of matrix elements. Ensures data is formatted correctly. O(N^2)."""
+        """Cleans up the first and last characters of matrix elements. Ensures data is formatted correctly. A row of a
+        lower triangle file ends at its diagonal 0, and a row of a full matrix file ends at its last distance.
+        O(N^2)."""
         for index, element in enumerate(self.temp):
             tokens = list(element)
             del tokens[0]
-            while tokens[-1] != '0':
+            while not tokens[-1].isdigit():
                 del tokens[-1]
             # Join characters and reassigns element back to matrix.
             self.temp[index] = ("".join(tokens))
@@ -439,7 +793,12 @@ class Prepper:
             self.temp[index] = self.temp[index].split(",")
 
     def transpose_matrix(self):
-        """Create a perfect square matrix. Transposes left triangle of the matrix over right triangle. O(N^2)."""
+        """Create a perfect square matrix. Transposes left triangle of the matrix over right triangle. A full matrix,
+        which holds one-way distances, is kept as it is and checked for symmetry. O(N^2)."""
+        if self.full_matrix():
+            self.symmetric = self.mirrored_matrix()
+            return
+        self.symmetric = True
         # Creates perfect square matrix by building a right triangle with fluff data.
         for index, row in enumerate(self.temp):
             while len(row) < len(self.temp[-1]):
@@ -449,10 +808,151 @@ class Prepper:
             for y in range(x, len(self.temp[-1])):
                 self.temp[x][y] = self.temp[y][x]
 
+    def full_matrix(self):
+        """Determines if every row holds a distance to every address, as in a file with one-way distances, instead of
+        only the lower triangle. O(N)."""
+        return all(len(row) == len(self.temp) for row in self.temp)
+
+    def mirrored_matrix(self):
+        """Determines if every distance of a full matrix is the same in both directions. O(N^2)."""
+        size = len(self.temp)
+        return all(float(self.temp[x][y]) == float(self.temp[y][x]) for x in range(size) for y in range(x))
+
+    def stream_distance_file(self):
+        """Reads the distance file one CSV row at a time for the mapped source, so neither the file contents nor the
+        matrix are held in memory. The checksum is taken in blocks. The header is the first row with address labels,
+        which span several lines. Every later row gives one address from its second label and the distances after it,
+        which are written to the matrix file as the row is read. The matrix file is only written when it was not built
+        from this distance file already. O(N^2) time, O(N) memory."""
+        digest = hashlib.sha1()
+        with open(self.distance_file) as file_python:
+            for block in iter(lambda: file_python.read(1 << 20), ''):
+                digest.update(block.encode())
+        self.checksum = digest.hexdigest()
+        build = not MappedDistances.matches(DISTANCE_MAP_FILE, self.checksum)
+        with open(self.distance_file, newline='') as file_python:
+            reader = csv.reader(file_python)
+            header = next(record for record in reader if len(record) > 2 and '\n' in record[2])
+            size = sum(1 for label in header[2:] if label)
+            rows = self.stream_matrix_rows(reader, build)
+            if build:
+                MappedDistances.write(DISTANCE_MAP_FILE, size, rows, self.checksum)
+            else:
+                for _ in rows:
+                    pass
+
+    def stream_matrix_rows(self, reader, values=True):
+        """Adds the address of every row left in a CSV reader to the address dictionary, keyed like the labels cleaned
+        by clean_matrix_file, and yields the row's distances without its empty trailing cells. Only the addresses are
+        read when values is False. O(N^2)."""
+        for record in reader:
+            if len(record) < 3 or not record[1].strip():
+                continue
+            address = record[1].replace("\n(", "; ").replace(")", "").strip()
+            self.address_dictionary[address] = len(self.address_dictionary)
+            if values:
+                cells = record[2:]
+                while cells and not cells[-1].strip():
+                    cells.pop()
+                yield [float(cell) for cell in cells]
+            else:
+                yield None
+
     def assign_matrix(self):
         """Converts all elements to floats and properly assigns the completed matrix list. O(N^2)."""
         self.distance_matrix = [[float(element) for element in nested_list] for nested_list in self.temp]
 
+    def make_neighbor_lists(self):
+        """Builds the k-nearest address lists for every address index. The lists are persisted in a file named for
+        their inputs and reused while those inputs are unchanged. O(N^2)."""
+        if self.load_neighbor_lists():
+            return
+        self.neighbor_lists = self.select_neighbors()
+        self.save_neighbor_lists()
+
+    def select_neighbors(self, vectorized=True):
+        """Returns the k-nearest address lists for every address index. Equal distances are ordered by address index,
+        so both selection paths return the same lists. The vectorized path is used when NumPy is installed. O(N^2)."""
+        size = len(self.distances)
+        count = min(NEIGHBOR_COUNT, size - 1)
+        if count <= 0:
+            return [[] for _ in range(size)]
+        numpy = None
+        if vectorized:
+            try:
+                import numpy
+            except ImportError:
+                numpy = None
+
+        neighbor_lists = []
+        if numpy is not None:
+            # Vectorized selection over blocks of rows. Each row is partitioned around its k-th smallest distance. The
+            # columns nearer than it are kept, and the columns equal to it are kept in index order until the row has
+            # k columns, so ties at the k-th neighbor go to the lowest index. The kept columns, already in index
+            # order, are then stably sorted by distance. The diagonal is masked so an address is never its own
+            # neighbor. O(N^2).
+            for first in range(0, size, DISTANCE_PAGE_ROWS):
+                block = range(first, min(first + DISTANCE_PAGE_ROWS, size))
+                matrix = numpy.array([self.distances[row] for row in block], dtype=float)
+                matrix[numpy.arange(len(block)), numpy.array(block)] = numpy.inf
+                kth = numpy.partition(matrix, count - 1, axis=1)[:, count - 1:count]
+                nearer = matrix < kth
+                tied = matrix == kth
+                room = count - nearer.sum(axis=1, keepdims=True)
+                kept = nearer | (tied & (numpy.cumsum(tied, axis=1) <= room))
+                columns = numpy.nonzero(kept)[1].reshape(len(block), count)
+                order = numpy.argsort(numpy.take_along_axis(matrix, columns, axis=1), axis=1, kind='stable')
+                neighbor_lists.extend(numpy.take_along_axis(columns, order, axis=1).tolist())
+        else:
+            # Heap selection of the k smallest (distance, index) pairs for each row. O(N^2 * log(K)).
+            for index in range(size):
+                row = self.distances[index]
+                candidates = [column for column in range(size) if column != index]
+                neighbor_lists.append(heapq.nsmallest(count, candidates, key=lambda x: (row[x], x)))
+        return neighbor_lists
+
+    def neighbor_key(self):
+        """Returns a fingerprint of every input the neighbor lists depend on: the distance file, the distance source,
+        the coordinate file when distances come from coordinates, the neighbor count, and the tie order. O(C) for a
+        coordinate file of C bytes, O(1) otherwise."""
+        digest = hashlib.sha1()
+        digest.update(("%s|%s|%d|index" % (self.checksum, DISTANCE_SOURCE, NEIGHBOR_COUNT)).encode())
+        if DISTANCE_SOURCE == 'coordinates':
+            with open(COORDINATE_FILE, 'rb') as file_python:
+                for chunk in iter(lambda: file_python.read(1 << 16), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def neighbor_file(self, key):
+        """Returns the path of the neighbor list file for a fingerprint, so runs on different inputs keep separate
+        files. O(1)."""
+        root, extension = os.path.splitext(NEIGHBOR_FILE)
+        return "%s %s%s" % (root, key[:12], extension)
+
+    def load_neighbor_lists(self):
+        """Loads persisted neighbor lists if they were built from the same inputs. O(N)."""
+        key = self.neighbor_key()
+        try:
+            with open(self.neighbor_file(key)) as file_python:
+                cache = json.load(file_python)
+        except (OSError, ValueError):
+            return False
+        if cache.get('key') != key:
+            return False
+        self.neighbor_lists = cache['neighbors']
+        return True
+
+    def save_neighbor_lists(self):
+        """Persists neighbor lists so they are computed once per set of inputs. Write failures are ignored. O(N)."""
+        key = self.neighbor_key()
+        file_name = self.neighbor_file(key)
+        try:
+            with open(file_name + '.tmp', 'w') as file_python:
+                json.dump({'key': key, 'neighbors': self.neighbor_lists}, file_python)
+            os.replace(file_name + '.tmp', file_name)
+        except OSError:
+            pass
+
     def clean_table_file(self):
         """Cleans up specific file characters. Splits the file string into a list of string elements. O(N)."""
         self.temp = self.temp.replace(",,", "")
@@ -494,18 +994,19 @@ class Prepper:
             element.append(element[1] + "; " + element[4])
 
     def format_grouped_packages(self):
-        """Groups all packages that has 'Group' in special notes or is mentioned in the group special notes. O(N^2)."""
+        """Groups all packages that has 'Group' in special notes or is mentioned in the group special notes. Each
+        package is joined in the package groups with every package its note mentions. O(N^2)."""
         # Identifies all packages that have 'Group' in special notes. O(N * K)
         group_pairs = []
         for element in self.package_table:
             if element[7][0:6] == '"Group':
                 # Records package IDs mentioned in special note.
-                group_pairs.append(str(element[7][6:]).strip())
+                group_pairs.append((element[0], str(element[7][6:]).strip()))
                 element[7] = "Group"
 
         # Identifies all package IDs that were mentioned to be grouped in special notes. O(N^2).
         group_ids = []
-        for element in group_pairs:
+        for owner, element in group_pairs:
             package_id = ""
             # Loops through all characters of group_pair element.
             for index, char in enumerate(element):
@@ -516,6 +1017,7 @@ class Prepper:
                     # If character is not a number, append package_id and restart loop.
                     if package_id != "":
                         group_ids.append(package_id)
+                        self.package_groups.union(owner, package_id)
                         package_id = ""
 
         # Adds the package IDs to the group label. O(N).
@@ -539,7 +1041,160 @@ class Prepper:
                 print("Index %02d: \t%s: %s" % (value, key, value))
 
 
-prepper = Prepper()
-prepper.execute()
-simulation = Simulation(prepper)
-simulation.execute()
+def prepare(distance_file=DISTANCE_FILE, package_file=PACKAGE_FILE):
+    """Reads the data files and builds the distance source. Returns the prepper. O(N^2)."""
+    prepper = Prepper(distance_file, package_file)
+    prepper.execute()
+    return prepper
+
+
+def command_run(args):
+    """Runs the interactive simulation."""
+    Simulation(prepare()).execute()
+
+
+def command_headless(args):
+    """Runs the simulation without GUI inputs or prints and prints the result."""
+    if args.seed is not None:
+        random.seed(args.seed)
+    simulation = Simulation(prepare())
+    simulation.run_headless()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        simulation.execute()
+    print("Finished at %s with %.1f miles." % (str(simulation.time).strip(), simulation.truck_1.miles +
+                                               simulation.truck_2.miles))
+
+
+def command_bench(args):
+    """Prints start-up time, then runs one headless simulation for each seed and prints its runtime and miles."""
+    imported = time.perf_counter()
+    prepare()
+    prepared = time.perf_counter()
+    print("Start-up: import %.1f ms, prepare %.1f ms" % ((imported - STARTED) * 1000, (prepared - imported) * 1000))
+    for seed in args.seeds:
+        random.seed(seed)
+        start = time.perf_counter()
+        simulation = Simulation(prepare())
+        simulation.run_headless()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            simulation.execute()
+        print("Seed %d: %.2f s, %.1f miles, finished at %s" % (seed, time.perf_counter() - start,
+                                                              simulation.truck_1.miles + simulation.truck_2.miles,
+                                                              str(simulation.time).strip()))
+
+
+def command_days(args):
+    """Runs a rolling multi-day simulation without GUI inputs or prints and prints a summary of every day."""
+    if args.seed is not None:
+        random.seed(args.seed)
+    simulation = Simulation(prepare())
+    simulation.run_headless()
+    simulation.run_days(args.days)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        simulation.execute()
+    for report in simulation.day_reports:
+        print("Day %(day)d: finished at %(finished)s, %(delivered)d delivered, %(carried)d carried over, "
+              "%(miles).1f total miles" % report)
+    print("Finished at %s with %.1f miles." % (str(simulation.time).strip(), simulation.truck_1.miles +
+                                               simulation.truck_2.miles))
+
+
+def scale_package_table(prepper, count):
+    """Grows the package table to count packages by copying packages with no special notes under new IDs. Copies are
+    due at the end of the day, so the urgent packages stay the same. Used to measure large days. O(N)."""
+    table = prepper.package_table
+    plain = [package for package in table if package[5] == 'EOD' and package[7] == 'Empty']
+    for number in range(len(table) + 1, count + 1):
+        package = plain[number % len(plain)][:]
+        package[0] = str(number)
+        table.append(package)
+
+
+def command_memory(args):
+    """Runs a headless simulation in stages and prints a tracemalloc report for each stage: the memory in use when
+    the stage ends, the peak during the stage, and the source lines that allocated the most memory still in use."""
+    import tracemalloc
+    if args.seed is not None:
+        random.seed(args.seed)
+    tracemalloc.start()
+    stages = []
+
+    def measure(name):
+        current, peak = tracemalloc.get_traced_memory()
+        stages.append((name, current, peak, tracemalloc.take_snapshot()))
+        tracemalloc.reset_peak()
+
+    prepper = prepare()
+    scale_package_table(prepper, args.packages)
+    measure("prepare")
+    simulation = Simulation(prepper)
+    simulation.run_headless()
+    measure("construct")
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        simulation.setup()
+        simulation.step()
+        measure("first load")
+        simulation.fast_forward(Clock.parse(args.until))
+        measure("run to " + args.until)
+    tracemalloc.stop()
+
+    previous = None
+    for name, current, peak, snapshot in stages:
+        print("%-16s current %9.1f KiB  peak %9.1f KiB" % (name, current / 1024, peak / 1024))
+        statistics = snapshot.compare_to(previous, 'lineno') if previous else snapshot.statistics('lineno')
+        for statistic in statistics[:args.top]:
+            frame = statistic.traceback[0]
+            print("    %9.1f KiB %+9.1f KiB  %s:%d" % (statistic.size / 1024, getattr(statistic, 'size_diff',
+                                                      statistic.size) / 1024, os.path.basename(frame.filename),
+                                                      frame.lineno))
+        previous = snapshot
+    delivered = sum(1 for _, data in simulation.package_records() if data[-1].startswith("Delivered"))
+    print("Packages: %d, delivered: %d, archived: %d, time: %s" % (len(prepper.package_table), delivered,
+                                                                  len(simulation.archive or ()),
+                                                                  str(simulation.time).strip()))
+
+
+def command_prepare(args):
+    """Builds the files derived from the distance file ahead of time: the neighbor lists, and the distance map file
+    when the mapped distance source is selected."""
+    prepper = prepare()
+    print("Prepared %d addresses and %d neighbor lists (checksum %s)." % (len(prepper.distances),
+                                                                          len(prepper.neighbor_lists),
+                                                                          prepper.checksum))
+    if args.check:
+        vectorized, plain = prepper.select_neighbors(), prepper.select_neighbors(vectorized=False)
+        mismatches = sum(1 for first, second in zip(vectorized, plain) if first != second)
+        print("Neighbor lists from both selection paths: %d of %d differ." % (mismatches, len(plain)))
+
+
+def main(argv=None):
+    """Parses the command line and runs a subcommand. Running without a subcommand starts the interactive
+    simulation."""
+    parser = argparse.ArgumentParser(description="Package delivery simulation.")
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('run', help="Run the interactive simulation.").set_defaults(function=command_run)
+    headless = commands.add_parser('headless', help="Run without GUI inputs and print the result.")
+    headless.add_argument('--seed', type=int, help="Random seed for package selection.")
+    headless.set_defaults(function=command_headless)
+    bench = commands.add_parser('bench', help="Print start-up time and time headless runs.")
+    bench.add_argument('seeds', type=int, nargs='*', default=[1, 2, 3], help="Random seeds to run.")
+    bench.set_defaults(function=command_bench)
+    days = commands.add_parser('days', help="Run a rolling multi-day simulation and print a summary of every day.")
+    days.add_argument('days', type=int, help="Number of days to simulate.")
+    days.add_argument('--seed', type=int, help="Random seed for package selection.")
+    days.set_defaults(function=command_days)
+    memory = commands.add_parser('memory', help="Print a memory report for each stage of a headless run.")
+    memory.add_argument('--packages', type=int, default=0, help="Grow the package table to this many packages.")
+    memory.add_argument('--until', default="10:00:00", help="Time of day the run stops, such as 10:00:00.")
+    memory.add_argument('--top', type=int, default=8, help="Source lines listed for each stage.")
+    memory.add_argument('--seed', type=int, help="Random seed for package selection.")
+    memory.set_defaults(function=command_memory)
+    prepare_files = commands.add_parser('prepare', help="Build derived data files.")
+    prepare_files.add_argument('--check', action='store_true', help="Compare the NumPy and pure Python neighbor lists.")
+    prepare_files.set_defaults(function=command_prepare)
+    args = parser.parse_args(argv)
+    getattr(args, 'function', command_run)(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,149 @@
+import array
 import collections
 import random
+import tempfile
+import threading
+from distances import SubsetDistances
+from paths import shortest_path
 from settings import *
 
 
+class Fleet:
+    """This is the fleet class that holds the moving state of every truck in flat arrays: miles driven, the second of
+    the arrival at the next address, current address, and stops left on the route. Each truck is a view over one index
+    of the arrays. Arrival seconds are worked out for a whole route when the truck departs, so nothing is driven on a
+    tick and arrivals are found with one mask. The arrays are NumPy arrays when NumPy is installed, and standard
+    library arrays searched in a loop otherwise."""
+    def __init__(self):
+        """Initialize fleet variables."""
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        self.numpy = numpy  # NumPy module, or None if NumPy is not installed.
+        self.trucks = []  # Trucks in index order.
+        self.miles = self.make_array('d')  # Miles driven by each truck. Each leg is added when it is finished.
+        self.arrival = self.make_array('d')  # Second each truck arrives at its next address.
+        self.current = self.make_array('q')  # Current address ID of each truck.
+        self.stops = self.make_array('q')  # Route locations left for each truck. Trucks with no stops stay parked.
+
+    def __len__(self):
+        """Return number of trucks. O(1)."""
+        return len(self.trucks)
+
+    def __getstate__(self):
+        """Modules cannot be pickled. The arrays are sent to other processes as lists. O(T)."""
+        return {'trucks': self.trucks, 'columns': [list(self.miles), list(self.arrival), list(self.current),
+                                                   list(self.stops)]}
+
+    def __setstate__(self, state):
+        """Rebuilds the arrays in the receiving process. O(T)."""
+        self.__init__()
+        self.trucks = state['trucks']
+        self.miles, self.arrival, self.current, self.stops = \
+            [self.make_array(code, values) for code, values in zip('ddqq', state['columns'])]
+
+    def make_array(self, code, values=()):
+        """Returns an array of doubles ('d') or integers ('q'). O(T)."""
+        if self.numpy is not None:
+            return self.numpy.array(values, dtype=float if code == 'd' else self.numpy.int64)
+        return array.array(code, values)
+
+    def add(self, truck, home):
+        """Adds a parked truck at its Hub. Returns the truck's index in the fleet arrays. O(T)."""
+        self.trucks.append(truck)
+        columns = [[float(x) for x in self.miles] + [0.0], [float(x) for x in self.arrival] + [0.0],
+                   [int(x) for x in self.current] + [home], [int(x) for x in self.stops] + [0]]
+        self.miles, self.arrival, self.current, self.stops = \
+            [self.make_array(code, values) for code, values in zip('ddqq', columns)]
+        return len(self.trucks) - 1
+
+    def arrivals(self, seconds):
+        """Returns the trucks that reached their next address by seconds since midnight of the first day, in index
+        order. O(T)."""
+        if self.numpy is not None:
+            arrived = (self.arrival <= seconds) & (self.stops > 0)
+            return [self.trucks[index] for index in self.numpy.flatnonzero(arrived)]
+        return [truck for index, truck in enumerate(self.trucks)
+                if self.arrival[index] <= seconds and self.stops[index] > 0]
+
+
 class Truck:
-    """This is the truck class that handles all package delivery logistics."""
-    def __init__(self, sim, identifier, available, last_trip, buffer):
+    """This is the truck class that handles all package delivery logistics. Miles, the arrival second at the next
+    address, and the current location are stored in the simulation's fleet arrays. The driver works within an optional
+    shift window and takes breaks at stops. Arrival seconds come from the simulation's speed profile and the breaks, and
+    are planned for the whole route when the truck departs."""
+    def __init__(self, sim, identifier, available, last_trip, buffer, home=0, capacity=INT_MAX):
         """Initialize truck variables."""
         self.simulation = sim  # Reference to simulation.
         self.identifier = identifier  # Truck ID number.
+        self.home = home  # Address ID of the Hub the truck is assigned to.
+        self.hub = None  # Reference to the Hub the truck is assigned to.
+        self.fleet = sim.fleet  # Fleet arrays that hold the truck's moving state.
+        self.index = self.fleet.add(self, home)  # Index of the truck in the fleet arrays.
         self.miles = 0.000  # Miles currently driven.
-        self.next_distance = 0  # Miles to next address.
-        self.current = 0  # Current location.
+        self.arrival = 0.0  # Second of the arrival at the next address.
+        self.current = home  # Current location.
         self.count = 0  # Number of packages loaded.
         self.bay = []  # Loaded package data.
         self.package_ids = []  # Loaded package IDs.
         self.locations = []  # Truck driving route.
         self.distances = []  # Driving route distances.
         self.weight = 0.0  # Sum of distances.
+        self.capacity = capacity  # Maximum package weight the truck can carry.
+        self.cargo = 0.0  # Weight of loaded packages.
         self.last_trip = last_trip  # Records if truck will return to hub.
         self.available = available  # Records if truck is driving.
+        self.start_available = available  # Availability at the start of every day.
         self.buffer = self.simulation.space(buffer)  # Buffer space for printing text.
         self.unload_ids = []  # Package IDs being delivered.
-
-    def drive(self):
-        """Drives the truck one second. O(1)."""
-        self.miles = self.miles + TRUCK_SPEED_PER_SECOND
-        self.next_distance = self.next_distance - TRUCK_SPEED_PER_SECOND
+        self.stop_times = []  # Predicted arrival second of every stop on the route, as planned at departure.
+        self.stops_done = 0  # Number of route stops reached.
+        self.eta_shift = 0.0  # Seconds the truck is behind the planned arrival times. Updated at every stop.
+        self.package_stops = {}  # Key = package ID; Value = index of the package's stop in stop_times.
+        shift = TRUCK_SHIFTS.get(identifier)
+        self.shift = None if shift is None else tuple(Clock.parse(x) for x in shift)  # Start and end second of a day.
+        self.breaks = sorted((Clock.parse(start), minutes * 60)
+                             for start, minutes in TRUCK_BREAKS.get(identifier, []))  # Start second and break seconds.
+        self.breaks_taken = 0  # Breaks taken or planned today, in start order.
+
+    def __getstate__(self):
+        """Drops the simulation and Hub references before the truck is sent to another process. O(1)."""
+        state = self.__dict__.copy()
+        state['simulation'] = None
+        state['hub'] = None
+        return state
+
+    @property
+    def miles(self):
+        """Miles currently driven. O(1)."""
+        return float(self.fleet.miles[self.index])
+
+    @miles.setter
+    def miles(self, value):
+        self.fleet.miles[self.index] = value
+
+    @property
+    def arrival(self):
+        """Second of the arrival at the next address. O(1)."""
+        return float(self.fleet.arrival[self.index])
+
+    @arrival.setter
+    def arrival(self, value):
+        self.fleet.arrival[self.index] = value
+
+    @property
+    def current(self):
+        """Current location. O(1)."""
+        return int(self.fleet.current[self.index])
+
+    @current.setter
+    def current(self, value):
+        self.fleet.current[self.index] = value
+
+    def sync_stops(self):
+        """Copies the number of route locations left into the fleet arrays. Called whenever the route changes. O(1)."""
+        self.fleet.stops[self.index] = len(self.locations)
 
     def deliver_package(self):
         """When truck arrives at a location, deliver all packages for that location from truck. O(N^2)."""
@@ -37,25 +154,92 @@ class Truck:
                 self.simulation.hash_table[int(package[0])][-1] = "Delivered at" + str(self.simulation.time)
                 self.unload_ids.append(package[0])
                 self.count = self.count - 1
+                self.cargo = self.cargo - package[4]
                 self.package_ids.pop(0)
+                self.package_stops.pop(int(package[0]), None)
                 self.bay.remove(package)
 
     def next_address(self):
-        """Update truck current location, driving route, and driving route distances. O(N)."""
+        """Update truck current location, driving route, and driving route distances. The finished leg is added to the
+        miles. O(N)."""
         self.current = self.locations.pop(0)
-        self.distances.pop(0)
+        self.miles = self.miles + self.distances.pop(0)
+        self.sync_stops()
+        # Every later arrival is moved by how far this arrival was from its planned time. O(1).
+        if self.stops_done < len(self.stop_times):
+            self.eta_shift = self.simulation.time.total_seconds() - self.stop_times[self.stops_done]
+            self.stops_done = self.stops_done + 1
         # Updates next location. Make available if in Hub.
         if self.distances:
-            self.next_distance = self.next_distance + self.distances[0]
+            self.arrival = self.stop_times[self.stops_done]
             self.weight = sum(self.distances)
         else:
             self.weight = 0.0
-            if self.current == 0:
+            if self.current == self.home:
                 self.available = True
 
+    def plan_arrivals(self, departure):
+        """Plans the arrival second of every stop from the route distances and the speed profile, and records the stop
+        of every loaded package. Each leg leaves once the breaks due at its first stop are over. The truck is next due
+        at the first planned stop. Called once when the truck departs. O(N * P)."""
+        profile = self.simulation.profile
+        midnight = self.simulation.day * 86400
+        self.stop_times = []
+        moment = departure
+        for distance in self.distances:
+            moment, self.breaks_taken = self.take_breaks(moment - midnight, self.breaks_taken)
+            moment = midnight + moment
+            # Arrivals are rounded to microseconds, so float noise cannot hold a whole second arrival back a tick.
+            moment = round(moment + profile.travel_seconds(distance, moment), 6)
+            self.stop_times.append(moment)
+        self.arrival = self.stop_times[0]
+        self.stops_done = 0
+        self.eta_shift = 0.0
+        first_stops = {}
+        for index, location in enumerate(self.locations):
+            first_stops.setdefault(location, index)
+        self.package_stops = {int(package[0]): first_stops[package[-1]] for package in self.bay}
+
+    def take_breaks(self, moment, taken):
+        """Returns the second the driver drives on from a stop reached at moment, and the number of breaks taken by
+        then. Every break that has started by moment and is not taken yet is taken at the stop. Seconds are since
+        midnight of the current day. O(B)."""
+        while taken < len(self.breaks) and self.breaks[taken][0] <= moment:
+            moment = moment + self.breaks[taken][1]
+            taken = taken + 1
+        return moment, taken
+
+    def on_shift(self, second, overtime=False):
+        """Determines if the driver's shift holds a second since midnight of the current day. With overtime, the shift
+        has no end. O(1)."""
+        return self.shift is None or self.shift[0] <= second and (overtime or second < self.shift[1])
+
+    def eta(self, package_id):
+        """Returns the predicted delivery second of a package loaded on the truck, or None if it is not loaded. O(1)."""
+        index = self.package_stops.get(int(package_id))
+        if index is None:
+            return None
+        return self.stop_times[index] + self.eta_shift
+
+    def return_time(self):
+        """Returns the predicted second the truck is next ready at its Hub, or None if it will not return. A truck
+        parked at its Hub is ready now, unless it is held until the delayed packages arrive or its driver's shift has
+        not started yet. O(1)."""
+        if not self.locations:
+            if self.current != self.home:
+                return None
+            now = self.simulation.time.total_seconds()
+            ready = now if self.available else max(now, self.simulation.flight_delay_time)
+            if self.shift is not None:
+                ready = max(ready, now - now % 86400 + self.shift[0])
+            return ready
+        if self.locations[-1] != self.home:
+            return None
+        return self.stop_times[-1] + self.eta_shift
+
     def print_simulation(self):
         """Print the event that occurred above truck string and print the simulation. O(N)."""
-        if self.available and self.current == 0:
+        if self.available and self.current == self.home:
             print(self.simulation.newline + self.buffer + "[Arrived at HUB]")
         else:
             print(self.simulation.newline + self.buffer + "[Delivered package " + str(', '.join(self.unload_ids)) + "]")
@@ -65,55 +249,95 @@ class Truck:
 
 
 class Clock:
-    """This is the clock class that keeps track of time in the simulation."""
-    def __init__(self, hour, minute, second):
+    """This is the clock class that keeps track of time in the simulation. Time is stored as seconds since midnight of
+    the first day, so advancing the clock is one addition. Hours, minutes, and seconds are only worked out when the
+    clock is displayed. Event times are parsed into seconds once with Clock.parse and compared as numbers."""
+    def __init__(self, seconds=0):
         """Initializes time keeping variables."""
-        self.hour = hour
-        self.minute = minute
-        self.second = second
+        self.seconds = seconds  # Seconds since midnight of the first day. May be fractional.
+        self.previous = seconds  # Seconds before the last advance.
 
     def __str__(self):
-        """Returns a string version of the clock class in non-military time. O(1)."""
-        return " %d:%02d:%02d %s" % (self.hour_mod(), self.minute, self.second, ("AM", "PM")[self.hour >= 12])
-
-    def tick_second(self):
-        """This function increments time by 1 second for each simulation tick. Adjusts hours and minutes. O(1)."""
-        self.second = self.second + 1
-        if self.second >= 60:
-            self.second = 0
-            self.minute = self.minute + 1
-            if self.minute >= 60:
-                self.minute = 0
-                self.hour = self.hour + 1
-                if self.hour >= 24:
-                    self.hour = 0
+        """Returns a string version of the clock class in non-military time. Days after the first are labeled. O(1)."""
+        text = " %d:%02d:%02d %s" % (self.hour_mod(), self.minute, self.second, ("AM", "PM")[self.hour >= 12])
+        if self.day:
+            text = text + " (Day %d)" % (self.day + 1)
+        return text
+
+    @property
+    def day(self):
+        """Returns the number of whole days since the simulation began. O(1)."""
+        return int(self.seconds // 86400)
+
+    @property
+    def hour(self):
+        """Returns clock hours in military time. O(1)."""
+        return int(self.seconds // 3600) % 24
+
+    @property
+    def minute(self):
+        """Returns clock minutes. O(1)."""
+        return int(self.seconds // 60) % 60
+
+    @property
+    def second(self):
+        """Returns whole clock seconds. O(1)."""
+        return int(self.seconds) % 60
+
+    def tick_second(self, seconds=1):
+        """This function advances time by one simulation tick. A tick is 1 second unless told otherwise and may be
+        fractional. O(1)."""
+        self.previous = self.seconds
+        self.seconds = self.seconds + seconds
 
     def hour_mod(self):
         """Returns clock hours in non-military time. O(1)."""
         return ((self.hour-1) % 12)+1
 
-    def compare_time(self, input_time):
-        """Determines if input time equals current time. O(1)."""
-        input_time = [int(x) for x in list(input_time.split(':'))]
-        return self.hour == input_time[0] and \
-            self.minute == input_time[1] and \
-            self.second == input_time[2]
+    def compare_time(self, input_seconds):
+        """Determines if the last tick reached input time. Input time is seconds since midnight. O(1)."""
+        return self.previous < input_seconds <= self.seconds
 
     def set_time(self, input_time):
         """Set current time on the clock to input time. O(1)."""
-        input_time = [int(x) for x in list(input_time.split(':'))]
-        self.hour = input_time[0]
-        self.minute = input_time[1]
-        self.second = input_time[2]
+        self.set_seconds(self.parse(input_time))
+
+    def total_seconds(self):
+        """Returns current time as whole seconds since midnight of the first day. O(1)."""
+        return int(self.seconds)
+
+    def set_seconds(self, seconds):
+        """Set current time on the clock to seconds since midnight of the first day. O(1)."""
+        self.seconds = seconds
+        self.previous = seconds
+
+    @staticmethod
+    def parse(input_time):
+        """Returns an input time string, such as 9:05:00, as seconds since midnight. O(1)."""
+        hour, minute, second = [int(x) for x in list(input_time.split(':'))]
+        return hour * 3600 + minute * 60 + second
+
+    @staticmethod
+    def parse_deadline(deadline):
+        """Returns a delivery deadline, such as 10:30 AM, as seconds since midnight. Returns None for EOD. O(1)."""
+        if deadline == "EOD":
+            return None
+        clock, meridiem = deadline.split()
+        hour, minute = [int(x) for x in clock.split(':')]
+        return (hour % 12 + (12 if meridiem.upper() == "PM" else 0)) * 3600 + minute * 60
 
 
 class HashTable:
-    """This is the hash table class that keepts track of package data."""
+    """This is the hash table class that keepts track of package data. Lookups and changes hold a lock, because the
+    service answers queries on one thread while the simulation delivers and archives packages on another, and a
+    removal or resize moves keys through slots that are briefly empty."""
     def __init__(self, size):
         """Initialize hash table variables."""
         self.size = size
         self.slots = [None] * self.size  # Package IDs are stored here.
         self.data = [None] * self.size  # Package data is stored here.
+        self.count = 0  # Number of occupied slots.
+        self.lock = threading.RLock()  # Guards the slots and data. Reentrant, since a resize puts every key again.
 
     def __len__(self):
         """Return hash table size. O(1)."""
@@ -142,56 +366,107 @@ class HashTable:
             table_string = table_string + repr(slot) + ": " + repr(self.get(slot)) + "\n"
         return table_string
 
+    def items(self):
+        """Yields every occupied slot and its data, as they were when iteration began. O(N)."""
+        with self.lock:
+            items = [(slot, data) for slot, data in zip(self.slots, self.data) if slot is not None]
+        yield from items
+
     def put(self, key, data):
         """Stores key and data into hash table. If load factor exceeds 70%, resize hash table. O(1)."""
-        # Get hash value of key.
-        hash_value = self.hash_function(key, len(self.slots))
-        hash_value_start = hash_value
-
-        # Allowed hash table to dynamically adjust size as load increases.
-        load_factor = len([a for a in self.data if a is not None]) / len(self)
-        if load_factor >= .7:
-            temp_slots = [None] * self.size
-            temp_data = [None] * self.size
-            self.size *= 2
-            self.slots = self.slots + temp_slots
-            self.data = self.data + temp_data
-
-        # If slot corresponding to hash value is empty, set slot and data.
-        if self.slots[hash_value] is None:
-            self.slots[hash_value] = key
-            self.data[hash_value] = data
-        else:
-            # If slot corresponding to hash value is equal to key, replace data.
-            if self.slots[hash_value] == key:
+        with self.lock:
+            # Allowed hash table to dynamically adjust size as load increases. The count of occupied slots is kept, so
+            # the load factor is found without scanning the table.
+            if self.count / len(self) >= .7:
+                self.resize(self.size * 2)
+
+            # Get hash value of key.
+            hash_value = self.hash_function(key, len(self.slots))
+
+            # If slot corresponding to hash value is empty, set slot and data.
+            if self.slots[hash_value] is None:
+                self.slots[hash_value] = key
                 self.data[hash_value] = data
+                self.count = self.count + 1
             else:
-                # If slot corresponding to hash value is not equal to key and is not empty, rehash hash value.
-                next_slot = self.rehash(hash_value, len(self.slots))
-                while self.slots[next_slot] is not None and self.slots[next_slot] != key:
-                    next_slot = self.rehash(next_slot, len(self.slots))
-                # Set slot and data.
-                if self.slots[next_slot] is None:
-                    self.slots[next_slot] = key
-                    self.data[next_slot] = data
+                # If slot corresponding to hash value is equal to key, replace data.
+                if self.slots[hash_value] == key:
+                    self.data[hash_value] = data
                 else:
-                    self.data[next_slot] = data
+                    # If slot corresponding to hash value is not equal to key and is not empty, rehash hash value.
+                    next_slot = self.rehash(hash_value, len(self.slots))
+                    while self.slots[next_slot] is not None and self.slots[next_slot] != key:
+                        next_slot = self.rehash(next_slot, len(self.slots))
+                    # Set slot and data.
+                    if self.slots[next_slot] is None:
+                        self.slots[next_slot] = key
+                        self.data[next_slot] = data
+                        self.count = self.count + 1
+                    else:
+                        self.data[next_slot] = data
 
     def get(self, key):
         """Returns the data corresponding to key from hash table. If slot for key is not found, return None. O(1)."""
-        # Gets hash value of key.
-        start_slot = self.hash_function(key, len(self.slots))
-        position = start_slot
-
-        # Search slots for key.
-        while self.slots[position] is not None:
-            # If key is found, return data.
-            if self.slots[position] == key:
-                return self.data[position]
-            # If key is not found, rehash new position.
+        with self.lock:
+            # Gets hash value of key.
+            start_slot = self.hash_function(key, len(self.slots))
+            position = start_slot
+
+            # Search slots for key.
+            while self.slots[position] is not None:
+                # If key is found, return data.
+                if self.slots[position] == key:
+                    return self.data[position]
+                # If key is not found, rehash new position.
+                position = self.rehash(position, len(self.slots))
+                if position == start_slot:
+                    return None
+
+    def remove(self, key):
+        """Removes key from hash table and returns its data, or None if key is not found. Keys later in the same run of
+        occupied slots are moved back into the gap, so lookups never stop early. If load factor falls below 17.5%,
+        shrink hash table. O(1) amortized."""
+        with self.lock:
+            # Search slots for key.
+            start_slot = self.hash_function(key, len(self.slots))
+            position = start_slot
+            while self.slots[position] != key:
+                if self.slots[position] is None:
+                    return None
+                position = self.rehash(position, len(self.slots))
+                if position == start_slot:
+                    return None
+            data = self.data[position]
+            self.slots[position] = None
+            self.data[position] = None
+            self.count = self.count - 1
+
+            # Moves each later key back into the gap unless its own slot lies between the gap and the key.
+            gap = position
             position = self.rehash(position, len(self.slots))
-            if position == start_slot:
-                return None
+            while self.slots[position] is not None:
+                home = self.hash_function(self.slots[position], len(self.slots))
+                if (gap < position and not gap < home <= position) or (position < gap and position < home <= gap):
+                    self.slots[gap], self.data[gap] = self.slots[position], self.data[position]
+                    self.slots[position], self.data[position] = None, None
+                    gap = position
+                position = self.rehash(position, len(self.slots))
+
+            # Shrinks hash table once most slots are empty, leaving room to grow before the next resize.
+            if self.size > 16 and self.count / len(self) < .175:
+                self.resize(max(16, int(self.count / .35) + 1))
+            return data
+
+    def resize(self, size):
+        """Places every key again in a hash table of a new size, because a key's slot depends on the size. O(N)."""
+        with self.lock:
+            items = list(self.items())
+            self.size = size
+            self.slots = [None] * self.size
+            self.data = [None] * self.size
+            self.count = 0
+            for key, data in items:
+                self.put(key, data)
 
     def hash_function(self, key, size):
         """Returns remainder of being divided by hash table size. O(1)."""
@@ -202,218 +477,696 @@ class HashTable:
         return (old_hash + 1) % size
 
 
+class PackageArchive:
+    """This is the package archive class that keeps the records of delivered packages out of the hash table. Each
+    record is written to a file as one line of tab-separated text, and only its offset in the file is kept in memory,
+    in an array indexed by package ID. The file is a temporary file that is deleted when it is closed, unless a file
+    name is given. Reads and writes share one file position, so they hold a lock: the service steps the simulation on a
+    worker thread while queries read the archive."""
+    def __init__(self, file_name=ARCHIVE_FILE):
+        """Initialize archive variables and open the file."""
+        self.file_name = file_name  # Path of the archive file. None uses a temporary file.
+        self.file = open(file_name, 'w+b') if file_name else tempfile.TemporaryFile()
+        self.offsets = array.array('q')  # Key = package ID; Value = offset of the record in the file, or -1.
+        self.count = 0  # Number of records.
+        self.lock = threading.Lock()  # Guards the file position and the offsets.
+
+    def __len__(self):
+        """Return number of records. O(1)."""
+        return self.count
+
+    def __contains__(self, key):
+        """Determines if key is in the archive. O(1)."""
+        return 0 <= key < len(self.offsets) and self.offsets[key] >= 0
+
+    def __getitem__(self, key):
+        """Get data from the archive. O(1)."""
+        return self.get(key)
+
+    def __setitem__(self, key, data):
+        """Put data in the archive. O(1) amortized."""
+        self.put(key, data)
+
+    def __str__(self):
+        """Returns a string of every record in the archive. O(N)."""
+        archive_string = "\nDelivered Package Archive\n"
+        for key, data in self.items():
+            archive_string = archive_string + repr(key) + ": " + repr(data) + "\n"
+        return archive_string
+
+    def put(self, key, data):
+        """Writes a record to the end of the file and stores its offset. O(1) amortized."""
+        record = ('\t'.join(str(x) for x in data) + '\n').encode()
+        with self.lock:
+            if key >= len(self.offsets):
+                self.offsets.extend(array.array('q', [-1]) * (key + 1 - len(self.offsets)))
+            self.file.seek(0, 2)
+            offset = self.file.tell()
+            self.file.write(record)
+            if self.offsets[key] < 0:
+                self.count = self.count + 1
+            self.offsets[key] = offset
+
+    def get(self, key):
+        """Reads the record for key from the file. If key is not found, return None. O(1)."""
+        with self.lock:
+            if key not in self:
+                return None
+            self.file.seek(self.offsets[key])
+            line = self.file.readline()
+        return line.decode().rstrip('\n').split('\t')
+
+    def items(self):
+        """Yields every package ID and record in package ID order. O(N)."""
+        for key in range(len(self.offsets)):
+            data = self.get(key)
+            if data is not None:
+                yield key, data
+
+    def close(self):
+        """Closes the file. A temporary file is deleted. O(1)."""
+        self.file.close()
+
+
+class PackageGroups:
+    """This is the package groups class that keeps packages that must be delivered together in disjoint sets, built
+    with union-find. Each package points to a parent package, and the package at the top of the chain is the root of
+    its group. Groups are joined by pointing the root of the smaller group at the root of the larger one, and chains are
+    halved as they are walked, so finding a group is close to O(1). Packages mentioned in one note, or linked through
+    notes of other packages, end up in the same group."""
+    def __init__(self):
+        """Initialize union-find variables."""
+        self.parent = {}  # Key = package ID; Value = parent package ID. A root is its own parent.
+        self.members = {}  # Key = root package ID; Value = package IDs in the group.
+
+    def __contains__(self, package_id):
+        """Determines if a package is in a group. O(1)."""
+        return package_id in self.parent
+
+    def __len__(self):
+        """Return number of groups. O(1)."""
+        return len(self.members)
+
+    def add(self, package_id):
+        """Adds a package as a group of its own if it is not in a group yet. O(1)."""
+        if package_id not in self.parent:
+            self.parent[package_id] = package_id
+            self.members[package_id] = [package_id]
+
+    def find(self, package_id):
+        """Returns the root package ID of a package's group. Every package on the way is pointed at its grandparent.
+        O(a(N))."""
+        parent = self.parent
+        while parent[package_id] != package_id:
+            parent[package_id] = parent[parent[package_id]]
+            package_id = parent[package_id]
+        return package_id
+
+    def union(self, first, second):
+        """Joins the groups of two packages. O(a(N)) plus the size of the smaller group."""
+        self.add(first)
+        self.add(second)
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return
+        if len(self.members[first]) < len(self.members[second]):
+            first, second = second, first
+        self.parent[second] = first
+        self.members[first].extend(self.members.pop(second))
+
+    def group(self, package_id):
+        """Returns the package IDs in a package's group, or only the package if it is in no group. O(a(N))."""
+        if package_id not in self.parent:
+            return [package_id]
+        return self.members[self.find(package_id)]
+
+    def groups(self):
+        """Returns the package IDs of every group. O(G)."""
+        return list(self.members.values())
+
+
+class Load:
+    """This is the load class that keeps track of the truck bay and the packages left to choose from while a truck is
+    being loaded. Packages are stored in dictionaries keyed by package ID and bucketed by address ID, so loading,
+    unloading, and address lookups are O(1). Every change is written to a journal. A snapshot is the journal length,
+    and rolling back undoes only the changes made since the snapshot. The journal holds plain functions rather than
+    bound methods, so it does not refer back to the load and a finished load is freed at once instead of waiting for
+    the garbage collector."""
+    def __init__(self, packages, count_limit=TRUCK_STORAGE_LIMIT, weight_limit=INT_MAX):
+        """Initialize load variables. Every package starts in the hub."""
+        self.count_limit = count_limit  # Maximum number of packages.
+        self.weight_limit = weight_limit  # Maximum weight of packages.
+        self.weight = 0.0  # Weight of loaded packages.
+        self.bay = {}  # Key = package ID; Value = package. Loaded packages in load order.
+        self.hub = {}  # Key = package ID; Value = package. Packages that can still be loaded.
+        self.addresses = collections.Counter()  # Key = address ID; Value = count of loaded packages.
+        self.bay_buckets = collections.defaultdict(dict)  # Key = address ID; Value = loaded packages by ID.
+        self.hub_buckets = collections.defaultdict(dict)  # Key = address ID; Value = hub packages by ID.
+        self.journal = []  # Changes made, in order. Each change is an undo function and a package.
+        for package in packages:
+            self.hub[package[0]] = package
+            self.hub_buckets[package[-1]][package[0]] = package
+
+    @property
+    def count(self):
+        """Returns number of packages loaded. O(1)."""
+        return len(self.bay)
+
+    def over_capacity(self):
+        """Determines if the loaded packages exceed the count or weight limit. O(1)."""
+        return len(self.bay) > self.count_limit or self.weight > self.weight_limit
+
+    def full(self):
+        """Determines if the load has reached the count or weight limit. O(1)."""
+        return len(self.bay) >= self.count_limit or self.weight >= self.weight_limit
+
+    def fits(self, package):
+        """Determines if a package can be loaded without exceeding the count or weight limit. O(1)."""
+        return len(self.bay) < self.count_limit and self.weight + package[4] <= self.weight_limit
+
+    def load(self, package):
+        """Moves a package from the hub onto the truck bay. O(1)."""
+        self.move_to_bay(package)
+        self.journal.append((Load.move_to_hub, package))
+
+    def unload(self, package):
+        """Moves a package from the truck bay back into the hub. O(1)."""
+        self.move_to_hub(package)
+        self.journal.append((Load.move_to_bay, package))
+
+    def drop(self, package):
+        """Removes a package from the hub so it cannot be loaded. O(1)."""
+        self.remove_from_hub(package)
+        self.journal.append((Load.return_to_hub, package))
+
+    def snapshot(self):
+        """Returns a marker that the load can be rolled back to. O(1)."""
+        return len(self.journal)
+
+    def rollback(self, snapshot):
+        """Undoes every change made since the snapshot, most recent first. O(K) for K changes."""
+        while len(self.journal) > snapshot:
+            undo, package = self.journal.pop()
+            undo(self, package)
+
+    def move_to_bay(self, package):
+        """Moves a package from the hub onto the truck bay without journaling. O(1)."""
+        self.remove_from_hub(package)
+        self.bay[package[0]] = package
+        self.bay_buckets[package[-1]][package[0]] = package
+        self.addresses[package[-1]] += 1
+        self.weight = self.weight + package[4]
+
+    def move_to_hub(self, package):
+        """Moves a package from the truck bay back into the hub without journaling. O(1)."""
+        del self.bay[package[0]]
+        bucket = self.bay_buckets[package[-1]]
+        del bucket[package[0]]
+        if not bucket:
+            del self.bay_buckets[package[-1]]
+        self.addresses[package[-1]] -= 1
+        if not self.addresses[package[-1]]:
+            del self.addresses[package[-1]]
+        self.weight = self.weight - package[4]
+        self.return_to_hub(package)
+
+    def remove_from_hub(self, package):
+        """Removes a package from the hub without journaling. O(1)."""
+        del self.hub[package[0]]
+        bucket = self.hub_buckets[package[-1]]
+        del bucket[package[0]]
+        if not bucket:
+            del self.hub_buckets[package[-1]]
+
+    def return_to_hub(self, package):
+        """Puts a package back into the hub without journaling. O(1)."""
+        self.hub[package[0]] = package
+        self.hub_buckets[package[-1]][package[0]] = package
+
+
 class Hub:
     """This is the Hub class that handles all package storing and loading logistics."""
-    def __init__(self, sim, import_packages):
+    def __init__(self, sim, import_packages, depot=0):
         """Initializes recursive variables and warehouse variables."""
         self.simulation = sim  # Reference to simulation.
+        self.depot = depot  # Address ID of the Hub. Every route starts here.
+        addresses = [depot] + self.relay_addresses(depot)  # The Hub and the relay points of its trucks.
+        self.distances = SubsetDistances(sim.distances, addresses)  # Distances between addresses served by the Hub.
+        self.symmetric = self.distances.symmetric  # Distances match both ways. A closed tour costs the same reversed.
         self.truck = None  # Reference to truck.
         self.fastest_route = [INT_MAX, [INT_MAX], INT_MAX]  # Stores fastest Hamiltonian_Cycle route data.
         self.subset_matrix = []  # Subset of the full distance matrix.
+        self.subset_cache = collections.OrderedDict()  # Key = unique addresses; Value = subset matrix.
+        self.profile = sim.profile  # Truck speed over the day.
+        self.neighbor_lists = None  # Nearest address IDs for each address ID. Taken from the simulation on first use.
+        self.time_cache = collections.OrderedDict()  # Key = (unique addresses, time bucket); Value = travel times.
+        self.solved_addresses = set()  # Unique addresses already solved by a seed of the current load.
         self.basecase = []  # Basecase to terminate recursive calls.
-        self.urgent_addresses = []  # Address IDs of urgent packages.
+        self.urgent_addresses = set()  # Address IDs of urgent packages.
         self.unique_count = 0  # Count of unique addresses.
+        self.restarts = 0  # Loading restarts for the current truck.
+        self.groups = sim.prepper.package_groups  # Packages that must be delivered together.
+        self.departure = 0  # Seconds since midnight of the current day when the current truck is planned.
+        self.restartable = True  # A restart can change the load's last stop. Set by the constraint check.
         self.do_not_ship_packages = []  # Packages that will not be loaded onto truck.
         self.do_not_ship_addresses = []  # Address IDs that will not be loaded onto truck.
-        self.do_not_ship(import_packages[:])  # Function call to construct do_not_ship variables.
-        self.warehouse = [x for x in import_packages if x not in self.do_not_ship_packages]  # Package selection pool.
-        self.reset = False
+        self.warehouse = {}  # Package selection pool.
+        self.parked = []  # Packages heavier than any truck of the Hub can carry. They are never loaded.
+        self.receive(import_packages)
+
+    @staticmethod
+    def relay_addresses(depot):
+        """Returns the address IDs of the relay points where the last trips of the Hub's trucks end. A last trip visits
+        its relay point even when no package is sent there. O(T)."""
+        return [TRUCK_RELAYS[truck] for truck in sorted(TRUCK_RELAYS) if TRUCK_DEPOTS.get(truck, 0) == depot]
+
+    def receive(self, packages):
+        """Adds a batch of packages to the Hub. Delayed and bad address packages wait in the do_not_ship lists and the
+        rest join the warehouse. Packages no truck of the Hub can carry are parked first. Called once for each day's
+        packages. O(N)."""
+        packages = self.park_overweight(packages)
+        self.distances.add([x[-1] for x in packages])
+        self.do_not_ship(packages)  # Function call to construct do_not_ship variables.
+        unavailable = {x[0] for x in self.do_not_ship_packages}
+        self.warehouse.update({x[0]: x for x in packages if x[0] not in unavailable})
+
+    def park_overweight(self, packages):
+        """Parks every package that weighs more than the largest weight limit of the trucks that may carry it, which
+        are the Hub's trucks, or only Truck 2 for packages that must ride on it. No load could ever take such a package,
+        so it would keep the day from ending. It is reported, marked in the hash table, and kept out of the warehouse
+        like an oversized group is kept out of its group. Returns the packages that can be carried. O(N)."""
+        trucks = [truck for truck, depot in TRUCK_DEPOTS.items() if depot == self.depot]
+        carried = []
+        for package in packages:
+            allowed = [2] if package[7] == "Truck 2" else trucks
+            limit = max([TRUCK_WEIGHT_LIMITS.get(truck, INT_MAX) for truck in allowed] or [INT_MAX])
+            if float(package[6]) <= limit:
+                carried.append(package)
+                continue
+            print("Error: Package " + package[0] + " weighs " + package[6] + ", more than any truck that may carry it "
+                  "can hold. It is parked at the Hub.")
+            self.simulation.hash_table[int(package[0])][-1] = "Parked at HUB - Over Weight Limit"
+            self.parked.append(package)
+        return carried
+
+    def __getstate__(self):
+        """Drops references to the simulation and the matrix caches before the Hub is sent to another process to plan a
+        load. O(1)."""
+        state = self.__dict__.copy()
+        state['simulation'] = None
+        state['truck'] = None
+        state['subset_cache'] = collections.OrderedDict()
+        state['time_cache'] = collections.OrderedDict()
+        if self.simulation is not None:
+            state['neighbor_lists'] = self.simulation.neighbors
+        return state
 
     def do_not_ship(self, packages):
         """Loops through all packages and identifies delayed + bad address packages.
-        Ensures that these packages are removed from the package selection pool. O(N^2)."""
-        # Remove excess data columns that are not important for loading the truck. O(N).
+        Ensures that these packages are removed from the package selection pool. O(N)."""
+        # Remove excess data columns that are not important for loading the truck. The weight is kept before the
+        # address ID, so each package becomes [ID, deadline, notes, status, weight, address ID]. O(N).
         for package in packages:
-            for index in [9, 6, 4, 3, 2, 1]:
+            package.pop(9)
+            weight = float(package.pop(6))
+            for index in [4, 3, 2, 1]:
                 package.pop(index)
+            package.insert(4, weight)
 
-        # Remove delayed packages from selection pool. O(N).
-        for package in packages[:]:
+        # Remove delayed packages from selection pool. Held package IDs are kept in a set instead of removing them from
+        # the list, which is O(N) for each removal. O(N).
+        held = set()
+        for package in packages:
             if package[2] == "Dropped 9:05":
                 self.do_not_ship_packages.append(package)
                 self.do_not_ship_addresses.append(package[-1])
-                packages.remove(package)
+                held.add(package[0])
 
         # Remove packages that share addresses with delayed packages from selection pool. O(N).
-        for package in packages[:]:
-            if package[-1] in self.do_not_ship_addresses:
+        addresses = set(self.do_not_ship_addresses)
+        for package in packages:
+            if package[0] not in held and package[-1] in addresses:
                 package[3] = "Unavailable at HUB"
                 self.do_not_ship_packages.append(package)
-                packages.remove(package)
+                held.add(package[0])
 
         # Remove bad address packages from selection pool. O(N).
-        for package in packages[:]:
-            if package[2] == "Bad Address":
+        for package in packages:
+            if package[0] not in held and package[2] == "Bad Address":
                 self.do_not_ship_packages.append(package)
                 self.do_not_ship_addresses.append(package[-1])
-                packages.remove(package)
+                held.add(package[0])
+
+    def nearest(self, address, k=NEIGHBOR_COUNT):
+        """Returns the k nearest address indexes to an address index, closest first. A Hub planning in another
+        process uses the lists it was sent with. O(K)."""
+        if self.neighbor_lists is None:
+            self.neighbor_lists = self.simulation.neighbors
+        return self.neighbor_lists[address][:k]
 
     def load_truck(self, truck):
         """Contains all function calls that load up the truck. O(M * N!)."""
         # Step 1: The truck enters the hub. Class variables are checked, reset, and tailored.
         self.truck_last_trip(truck)
-        bay, ids, indexes, hub, count = self.setup_variables()
-        bay, ids, indexes, hub, count = self.truck_specific_packages(bay, ids, indexes, hub, count)
-
-        # Step 2: The truck is loaded with urgent packages that have delivery deadlines.
-        bay, ids, indexes, hub, count = self.load_urgent_packages(bay, ids, indexes, hub, count)
-        bay, ids, indexes, hub, count = self.load_address_pairs(bay, ids, indexes, hub, count)
-        bay, ids, indexes, hub, count = self.unique_max_load(bay, ids, indexes, hub, count, True)
-        bay, ids, indexes, hub, count = self.duplicate_max_load(bay, ids, indexes, hub, count)
-
-        # Step 3: The truck is loaded with the best random set of packages.
-        bay, ids, indexes, hub, count = self.seed_package_selector(bay, ids, indexes, hub, count)
 
-        # Step 4: The truck finds the lowest mileage route.
-        uniques = self.hamiltonian_cycle_setup(indexes, count, False)
+        # Steps 2 to 4: The packages and the lowest mileage route are planned.
+        ids, route = self.plan_truck(truck)
 
         # Step 5: The truck departs the hub with all packages loaded.
-        self.finalize_variables(uniques, bay)
-        self.finalize_truck(count, bay)
+        self.load_planned(truck, ids, route[0], route[1], route[2])
+
+    def plan_truck(self, truck, seed=None):
+        """Selects the packages and finds the lowest mileage route for the truck without changing the warehouse, so
+        loads for separate Hubs can be planned in separate processes. A seed is given when planning in another process
+        so worker processes do not share one random sequence. Returns the package IDs and the fastest route.
+        O(M * N!)."""
+        self.truck = truck
+        if seed is not None:
+            random.seed(seed)
+        self.restarts = 0
+        while True:
+            load = self.setup_variables()
+            self.truck_specific_packages(load)
+
+            # Step 2: The truck is loaded with urgent packages that have delivery deadlines.
+            self.load_urgent_packages(load)
+            self.check_constraints(load)
+            self.load_address_pairs(load)
+            self.unique_max_load(load, True)
+            self.duplicate_max_load(load)
+
+            # Step 3: The truck is loaded with the best random set of packages.
+            self.seed_package_selector(load)
+
+            # Step 4: The truck finds the lowest mileage route.
+            uniques = self.hamiltonian_cycle_setup(load.addresses, load.count, False)
+            if self.finalize_variables(uniques):
+                return list(load.bay), self.fastest_route
+
+    def load_planned(self, truck, ids, cost, locations, distances):
+        """Removes the planned packages from the warehouse and loads the truck with them and the planned route. Used
+        for planned loads and for loads read from the event log. O(N)."""
+        self.truck = truck
+        bay = [self.warehouse.pop(str(package_id)) for package_id in ids if str(package_id) in self.warehouse]
+        self.fastest_route = [cost, locations, distances]
+        self.finalize_truck(len(bay), bay)
 
     def truck_last_trip(self, truck):
         """Determines if this is the truck's last trip from the Hub.
         Truck 1 will not return to the Hub when it departs as Truck 2 can handle the remaining package deliveries.
-        Truck 2 will not return to the Hub if the Hub is empty. O(1)."""
+        Truck 2 will not return to the Hub if every package left in the Hub fits on it by count and weight. A truck that
+        is the only truck at its Hub, or whose Hub mates are all on their last trips, must return while delayed packages
+        are still expected. The departure time is recorded for the deadline checks. O(N + T)."""
         self.truck = truck
-        if self.truck.identifier == 1 or len(self.warehouse) <= TRUCK_STORAGE_LIMIT:
+        self.departure = self.simulation.time.total_seconds() - self.simulation.day * 86400
+        mates = [other for other in self.simulation.trucks if other is not truck and other.home == truck.home]
+        if self.truck.identifier == 1 and mates:
             self.truck.last_trip = True
+        else:
+            emptied = len(self.warehouse) <= TRUCK_STORAGE_LIMIT and \
+                sum(package[4] for package in self.warehouse.values()) <= self.truck.capacity
+            returning = any(not other.last_trip for other in mates)
+            self.truck.last_trip = emptied and (returning or not self.do_not_ship_packages)
 
     def setup_variables(self):
-        """Reset class variables. Construct function variables. O(K)."""
+        """Reset class variables. Construct the load of packages that can be selected from the warehouse. O(N)."""
         # Reset class variables.
         self.basecase = []
         self.subset_matrix = []
-        self.basecase = []
-        self.urgent_addresses = []
+        self.solved_addresses = set()
+        self.urgent_addresses = set()
         self.unique_count = 0
         self.fastest_route = [INT_MAX, [INT_MAX], INT_MAX]
-        self.reset = False
 
-        # Construct function variables.
-        count = 0  # Count of packages.
-        bay = []  # List of packages.
-        ids = []  # List of package IDs.
-        indexes = []  # List of address IDs.
-        hub = self.warehouse[:]  # Copy of package selection pool.
-        return bay, ids, indexes, hub, count
+        # Construct load of packages from package selection pool.
+        return Load(self.warehouse.values(), TRUCK_STORAGE_LIMIT, self.truck.capacity)
 
-    def truck_specific_packages(self, bay, ids, indexes, hub, count):
+    def truck_specific_packages(self, load):
         """Remove all packages that are specific to Truck 2 from available packages if Truck ID is 1.
-        As these packages are removed, remove any packages that share an address with these packages. O(N^3)."""
+        As these packages are removed, remove any packages that share an address with these packages. O(N)."""
         if self.truck.identifier == 1:
-            for package in hub[:]:
-                if package[2] == "Truck 2":
-                    hub.remove(package)
-                    for pair in hub[:]:
-                        if pair[-1] == package[-1]:
-                            hub.remove(pair)
-        return bay, ids, indexes, hub, count
-
-    def load_urgent_packages(self, bay, ids, indexes, hub, count):
-        """Load all time-sensitive and group-sensitive packages onto the truck. Store their addresses. O(N^2)."""
-        for package in hub[:]:
+            addresses = {package[-1] for package in load.hub.values() if package[2] == "Truck 2"}
+            for address in addresses:
+                for package in list(load.hub_buckets[address].values()):
+                    load.drop(package)
+
+    def load_urgent_packages(self, load):
+        """Load all time-sensitive and group-sensitive packages onto the truck. Store their addresses. O(N)."""
+        for package in list(load.hub.values()):
             if package[1] != "EOD" or package[2] == "Group":
-                bay, ids, indexes, hub, count = self.loading(package, bay, ids, indexes, hub, count)
-                self.urgent_addresses.append(package[-1])
-        return bay, ids, indexes, hub, count
-
-    def load_address_pairs(self, bay, ids, indexes, hub, count):
-        """Load all packages that share an address with any packages currently loaded. O(N^2)."""
-        if count > 0:
-            for package in hub[:]:
-                if package[-1] in indexes:
-                    bay, ids, indexes, hub, count = self.loading(package, bay, ids, indexes, hub, count)
-        return bay, ids, indexes, hub, count
-
-    def unique_max_load(self, bay, ids, indexes, hub, count, urgent):
-        """Remove packages that have unique addresses until below truck capacity. O(N^2)."""
-        if count > TRUCK_STORAGE_LIMIT:
-            duplicate = [k for k, v in collections.Counter(indexes).items() if v > 1]
-            for package in bay[:]:
+                load.load(package)
+                self.urgent_addresses.add(package[-1])
+
+    def check_constraints(self, load):
+        """Rejects urgent packages that cannot be delivered as loaded before any route is searched, so neither the
+        search nor the restart check in finalize_variables spends time on them. The checks use the package groups and
+        the time of a direct leg from the Hub:
+
+            1) A group with more packages or weight than the truck holds can never ride together. Its packages are
+            delivered as ordinary packages.
+
+            2) A group with a member that cannot ride on this truck now, because it is held at the Hub or shares an
+            address with a package for the other truck, is taken off this load and waits for a truck that can take
+            every member.
+
+            3) A deadline that is missed even on a direct leg from the Hub is missed by every route, so its address
+            stops being urgent and the route is not restarted for it.
+
+            4) If no package at an address that is not urgent still fits, every route ends at an urgent address, so
+            the route is not restarted at all.
+
+        O(N)."""
+        held = {package[0]: package for package in self.do_not_ship_packages}
+        for root in {self.groups.find(x) for x in load.bay if x in self.groups}:
+            members = [self.warehouse.get(x) or held[x] for x in self.groups.group(root)
+                       if x in self.warehouse or x in held]
+            if len(members) > load.count_limit or sum(package[4] for package in members) > load.weight_limit:
+                print("Error: Package group " + str(sorted(int(x[0]) for x in members)) + " does not fit on truck " +
+                      str(self.truck.identifier) + ". Its packages will be delivered separately.")
+                for package in members:
+                    if package[2] == "Group":
+                        package[2] = "Empty"
+            elif any(x[0] not in load.bay and x[0] not in load.hub for x in members):
+                for package in members:
+                    if package[0] in load.bay:
+                        load.unload(package)
+                    if package[0] in load.hub:
+                        load.drop(package)
+
+        # Urgent addresses are the addresses of grouped packages and of deadlines that can still be met.
+        self.urgent_addresses = set()
+        for package in load.bay.values():
+            deadline = Clock.parse_deadline(package[1])
+            if deadline is not None and self.departure + self.leg_seconds(package[-1], self.departure) > deadline:
+                print("Error: Package " + package[0] + " will miss its " + package[1] + " deadline on any route.")
+            elif deadline is not None or package[2] == "Group":
+                self.urgent_addresses.add(package[-1])
+        self.restartable = any(package[-1] not in self.urgent_addresses and load.fits(package)
+                               for package in load.hub.values())
+
+    def leg_seconds(self, address, departure):
+        """Returns the seconds a truck takes to drive straight from the Hub to an address, leaving at departure.
+        O(P)."""
+        return self.profile.travel_seconds(self.distances.distance(self.depot, address), departure)
+
+    def load_address_pairs(self, load):
+        """Load all packages that share an address with any packages currently loaded. O(N)."""
+        if load.count > 0:
+            for address in list(load.addresses):
+                for package in list(load.hub_buckets.get(address, {}).values()):
+                    load.load(package)
+
+    def unique_max_load(self, load, urgent):
+        """Remove packages that have unique addresses until below truck capacity by count and weight. O(N)."""
+        if load.over_capacity():
+            duplicate = {k for k, v in load.addresses.items() if v > 1}
+            for package in list(load.bay.values()):
                 # Removes non-grouped, unique-address packages.
                 if package[2] != "Group" and package[-1] not in duplicate and urgent:
-                    bay, ids, indexes, hub, count = self.unloading(package, bay, ids, indexes, hub, count)
+                    load.unload(package)
                 # Removes non-urgent, non-grouped, unique-address packages.
                 elif package[1] == 'EOD' and package[2] != "Group" and package[-1] not in duplicate:
-                    bay, ids, indexes, hub, count = self.unloading(package, bay, ids, indexes, hub, count)
-                # Breaks loop when equal or below storage limit.
-                if count <= TRUCK_STORAGE_LIMIT:
+                    load.unload(package)
+                # Breaks loop when equal or below storage and weight limits.
+                if not load.over_capacity():
                     break
-        return bay, ids, indexes, hub, count
-
-    def duplicate_max_load(self, bay, ids, indexes, hub, count):
-        """Remove packages that have shared addresses until below truck capacity. O(N^3)."""
-        while count > TRUCK_STORAGE_LIMIT:
-            for package in bay[:]:
-                # Removes non-grouped, shared-address packages.
-                if package[2] != "Group":
-                    for pair in bay[:]:
-                        if pair[-1] == package[-1]:
-                            bay, ids, indexes, hub, count = self.unloading(pair, bay, ids, indexes, hub, count)
-                    break
-        return bay, ids, indexes, hub, count
 
-    def seed_package_selector(self, bay, ids, indexes, hub, count):
+    def duplicate_max_load(self, load):
+        """Remove packages that have shared addresses until below truck capacity by count and weight. O(N^2) worst
+        case, O(N) when the first non-grouped package is near the front of the bay."""
+        while load.over_capacity():
+            # Finds the first non-grouped package and removes every package that shares its address.
+            address = next((package[-1] for package in load.bay.values() if package[2] != "Group"), None)
+            if address is None:
+                break
+            for pair in list(load.bay_buckets[address].values()):
+                load.unload(pair)
+
+    def seed_package_selector(self, load):
         """Randomly selects package to load and finds the minimum distance to deliver all packages. This function will
-        loop M times and save the best result upon completion. These results are then returned. O(M * N!)."""
-        if count == 16:  # Skip trucks at full capacity.
-            return bay, ids, indexes, hub, count
+        loop M times and save the best result upon completion. Each seed is rolled back to the same snapshot by undoing
+        only its own changes, then the best seed is loaded again. O(M * N!)."""
+        if load.full():  # Skip trucks at full capacity.
+            return
         print("\nSelecting the most optimal packages to load onto truck " + str(self.truck.identifier) + ".")
 
-        # Declare reset variables and best result variables. O(K).
-        reset_bay, reset_ids, reset_indexes, reset_hub, reset_count = bay[:], ids[:], indexes[:], hub[:], count
-        best, best_bay, best_ids, best_indexes, best_hub, best_count = [INT_MAX], None, None, None, None, None
+        # Declare snapshot and best result variables. The selection pool is the same for every seed. O(N).
+        snapshot = load.snapshot()
+        pool = list(load.hub.values())
+        best, best_ids = [INT_MAX], []
 
         # Runs seed selection loop. O(M * N!).
         for seed in range(1, SEED_COUNT + 1):
-            bay, ids, indexes, hub, count = reset_bay[:], reset_ids[:], reset_indexes[:], reset_hub[:], reset_count
-            bay, ids, indexes, hub, count = self.seed_random_sample(bay, ids, indexes, hub, count)
-            bay, ids, indexes, hub, count = self.load_address_pairs(bay, ids, indexes, hub, count)
-            bay, ids, indexes, hub, count = self.unique_max_load(bay, ids, indexes, hub, count, False)
-            bay, ids, indexes, hub, count = self.duplicate_max_load(bay, ids, indexes, hub, count)
-            bay, ids, indexes, hub, count, best, record = self.seed_minimum(bay, ids, indexes, hub, count, best, seed)
+            load.rollback(snapshot)
+            self.seed_random_sample(load, pool)
+            self.load_address_pairs(load)
+            self.unique_max_load(load, False)
+            self.duplicate_max_load(load)
+            self.knapsack_fill(load)
+            self.neighbor_fill(load)
+            best, record = self.seed_minimum(load, best, seed)
             # Saves best results if minimum distance is lowest.
             if record:
-                best_bay, best_ids, best_indexes, best_hub, best_count = bay, ids, indexes, hub, count
-            if len(hub) == 0:
+                best_ids = list(load.bay)
+            if not load.hub:
                 break
 
-        return best_bay, best_ids, best_indexes, best_hub, best_count
-
-    def seed_random_sample(self, bay, ids, indexes, hub, count):
-        """Load the truck with a random sample of packages. O(N^2)."""
+        # Reloads the best seed. Packages the best seed unloaded from the snapshot are unloaded again. O(N).
+        load.rollback(snapshot)
+        keep = set(best_ids)
+        for package in [x for x in load.bay.values() if x[0] not in keep]:
+            load.unload(package)
+        for package_id in best_ids:
+            if package_id in load.hub:
+                load.load(load.hub[package_id])
+
+    def seed_random_sample(self, load, pool):
+        """Load the truck with a random sample of packages from the selection pool. Sampled packages that would exceed
+        the weight limit are skipped. O(K)."""
         try:
-            random_sample = random.sample(hub, TRUCK_STORAGE_LIMIT - count)
+            random_sample = random.sample(pool, TRUCK_STORAGE_LIMIT - load.count)
         except ValueError:
-            random_sample = random.sample(hub, len(hub))
+            random_sample = random.sample(pool, len(pool))
         for package in random_sample:
-            bay, ids, indexes, hub, count = self.loading(package, bay, ids, indexes, hub, count)
-        return bay, ids, indexes, hub, count
+            if load.fits(package):
+                load.load(package)
+
+    def knapsack_fill(self, load):
+        """Fills the space left by the weight limit with packages at addresses the truck already visits, so they add no
+        miles. Each address is a bounded knapsack item with one copy per package. Every package is worth the same, so
+        loading the lightest copies first fits the most packages. O(K log K)."""
+        if load.full():
+            return
+        spare = [package for address in load.addresses for package in load.hub_buckets.get(address, {}).values()]
+        for package in sorted(spare, key=lambda x: x[4]):
+            if not load.fits(package):
+                break
+            load.load(package)
+
+    def neighbor_fill(self, load):
+        """Fills the space still left after the knapsack fill with whole addresses near the addresses the truck already
+        visits, so each extra stop is a short detour. Neighbors come from the precomputed neighbor lists, nearest
+        first, and an address is loaded only if every package waiting for it fits, so no address is split between two
+        trucks. O(A * K)."""
+        if load.full():
+            return
+        for address in list(load.addresses):
+            for neighbor in self.nearest(address):
+                packages = list(load.hub_buckets.get(neighbor, {}).values())
+                if not packages or neighbor in load.addresses:
+                    continue
+                if load.count + len(packages) <= load.count_limit and \
+                        load.weight + sum(package[4] for package in packages) <= load.weight_limit:
+                    for package in packages:
+                        load.load(package)
+                if load.full():
+                    return
 
-    def seed_minimum(self, bay, ids, indexes, hub, count, best, seed):
-        """Finds the minimum distance to deliver all packages. O(K)."""
+    def seed_minimum(self, load, best, seed):
+        """Finds the minimum distance to deliver all packages. A seed that visits the same addresses as an earlier seed
+        cannot beat the record, because the fast search only finds routes shorter than the record, so it is skipped.
+        O(N!)."""
         # Saves record lowest distance.
         if self.fastest_route[0] < best[0]:
             best = self.fastest_route[:]
         # Hamiltonian Cycle will find the minimum distance for this seed.
-        self.hamiltonian_cycle_setup(indexes, count, True)
+        addresses = tuple(self.unique_addresses(load.addresses))
+        if addresses not in self.solved_addresses:
+            self.solved_addresses.add(addresses)
+            self.hamiltonian_cycle_setup(load.addresses, load.count, True)
         # Checks if this seed is the record lowest distance.
         if self.fastest_route[0] < best[0]:
             print("Seed Generation " + str(seed) + " / " + str(SEED_COUNT) + ": Fastest Path " +
-                  str(self.fastest_route[0]) + ": Package IDs " + str(ids))
+                  str(self.fastest_route[0]) + ": Package IDs " + str(list(load.bay)))
             record = True
         else:
             print("Seed Generation " + str(seed) + " / " + str(SEED_COUNT))
             record = False
-        return bay, ids, indexes, hub, count, best, record
+        return best, record
+
+    def unique_addresses(self, indexes):
+        """Returns the unique addresses for loaded packages, sorted, with the Hub first. A last trip that ends at a
+        relay point also visits the relay point. O(K log K)."""
+        unique_addresses = set(indexes) - {self.depot}
+        if self.truck.last_trip and self.truck.identifier in TRUCK_RELAYS:
+            unique_addresses.add(TRUCK_RELAYS[self.truck.identifier])
+        unique_addresses = sorted(unique_addresses - {self.depot})
+        unique_addresses.insert(0, self.depot)
+        return unique_addresses
+
+    def route_end(self, unique_addresses):
+        """Returns the subset index where a last trip ends: the relay point of the truck, or None if the trip ends at
+        its last stop. A relay point at the Hub ends the trip back at the Hub. O(K)."""
+        if self.truck.identifier not in TRUCK_RELAYS:
+            return None
+        return unique_addresses.index(TRUCK_RELAYS[self.truck.identifier])
+
+    def cached_subset_matrix(self, unique_addresses):
+        """Returns the subset matrix for a list of unique addresses. Matrices are kept in a least recently used cache,
+        so seeds that visit the same addresses and the final slow solve of the best seed reuse a matrix instead of
+        building it again. A new matrix is gathered from the Hub's subset distances, which already hold every row
+        this Hub can visit. O(1) when cached, O(K^2) otherwise."""
+        key = tuple(unique_addresses)
+        matrix = self.subset_cache.get(key)
+        if matrix is not None:
+            self.subset_cache.move_to_end(key)
+            return matrix
+        matrix = self.distances.submatrix(unique_addresses)
+        self.subset_cache[key] = matrix
+        if len(self.subset_cache) > SUBSET_CACHE_SIZE:
+            self.subset_cache.popitem(last=False)
+        return matrix
+
+    def time_matrix(self, unique_addresses, second):
+        """Returns the travel time matrix for a list of unique addresses in the time bucket that holds a second of the
+        day. Matrices are built from the subset matrix and kept in a least recently used cache like subset matrices, so
+        every bucket of an address list is built once. O(1) when cached, O(K^2 * P) otherwise."""
+        key = (tuple(unique_addresses), self.profile.bucket_of(second))
+        matrix = self.time_cache.get(key)
+        if matrix is not None:
+            self.time_cache.move_to_end(key)
+            return matrix
+        matrix = self.profile.bucket_matrix(self.cached_subset_matrix(unique_addresses), key[1])
+        self.time_cache[key] = matrix
+        if len(self.time_cache) > SUBSET_CACHE_SIZE:
+            self.time_cache.popitem(last=False)
+        return matrix
+
+    def route_seconds(self, unique_addresses, locations, departure):
+        """Returns the arrival second at every stop of a route given in subset indexes, leaving the Hub at departure
+        in seconds since midnight. Each leg is timed with the travel time matrix of the bucket it leaves in, and the
+        truck's breaks are taken at the stops they fall due at. O(K * B)."""
+        times, moment, taken = [], departure, self.truck.breaks_taken
+        for start, end in zip(locations, locations[1:]):
+            moment, taken = self.truck.take_breaks(moment, taken)
+            moment = moment + self.time_matrix(unique_addresses, moment)[start][end]
+            times.append(moment)
+        return times
 
     def hamiltonian_cycle_setup(self, indexes, count, fast):
         """Sets up critical variables for the hamiltonian cycle function. O(N!)."""
-        # Identify unique addresses for loaded packages.
-        unique_addresses = list(set(indexes))
-        unique_addresses.append(0)
-        unique_addresses.sort()
+        # Identify unique addresses for loaded packages. The Hub is always first.
+        unique_addresses = self.unique_addresses(indexes)
 
         # Construct subset matrix to contain the travel distances of unique addresses.
         #                                                                     0     1     2     3     4
@@ -427,13 +1180,7 @@ class Hub:
         #                                                                0  [0.0,  1.6,  10.6]
         #                The subset matrix with [0, 2, 4]:               1  [1.0,  0.0,  5.5 ]
         #                                                                2  [11.2, 6.7,  0.0 ]
-        self.subset_matrix = []
-        for row_index in unique_addresses:
-            subset = []
-            row = self.simulation.distances[row_index]
-            for col_index in unique_addresses:
-                subset.append(row[col_index])
-            self.subset_matrix.append(subset)
+        self.subset_matrix = self.cached_subset_matrix(unique_addresses)
 
         # Set up critical recursive variables.
         self.unique_count = len(unique_addresses)  # Number of unique addresses.
@@ -442,8 +1189,20 @@ class Hub:
         bitmap[0] = True
 
         # If fast, will find minimum miles. If slow, will find minimum miles, location history, and distance history.
-        if fast:
+        # A last trip does not return to the Hub, so it is searched as an open path.
+        if self.truck.last_trip:
+            route = shortest_path(self.subset_matrix, self.route_end(unique_addresses), self.fastest_route[0])
+            if not fast:
+                self.fastest_route = route
+            elif route[0] < self.fastest_route[0]:
+                self.fastest_route[0] = route[0]
+        elif fast:
             self.hamiltonian_cycle_fast(bitmap, 0, 0)
+        elif self.simulation is not None and self.unique_count - 1 >= SOLVE_PARALLEL_STOPS and \
+                self.simulation.solve_workers() > 1:
+            # Large routes are split into branches that are searched on several cores.
+            solver = self.simulation.branch_solver()
+            self.fastest_route = solver.solve(self.subset_matrix, self.truck.last_trip, self.fastest_route[0])
         else:
             self.hamiltonian_cycle_slow(bitmap, 0, 0, [], [0])
 
@@ -458,7 +1217,11 @@ class Hub:
         then the minimum number of miles to deliver all packages is the only interest. Location history and distance
         history is not important because only 1 seed will actually be used for the truck route, not several dozen. It
         is not optimal to compute the location and distance history for all seeds if all but one will be thrown out.
-        Later, when the best seed is found, the location history and distance history can be calculated. O(N!).
+        Later, when the best seed is found, the location history and distance history can be calculated.
+
+        When distances are symmetric, a tour that returns to the Hub costs the same driven backwards, so only tours
+        that visit stop 1 before stop 2 are searched. This halves the search. One-way distances and last trips, which
+        do not return to the Hub, search every order. O(N!).
         """
         if bitmap == self.basecase:
             if self.truck.last_trip:
@@ -472,6 +1235,8 @@ class Hub:
             return
         for _next in range(1, self.unique_count):
             if not bitmap[_next]:
+                if _next == 2 and not bitmap[1] and self.symmetric and not self.truck.last_trip:
+                    continue
                 new_bitmap = bitmap[:]
                 new_bitmap[_next] = True
                 self.hamiltonian_cycle_fast(new_bitmap, _next, cost + self.subset_matrix[position][_next])
@@ -558,33 +1323,42 @@ class Hub:
                 new_cost = cost + self.subset_matrix[position][_next]  # Updates the total miles.
                 self.hamiltonian_cycle_slow(new_bitmap, _next, new_cost, new_distances, new_locations)  # Recursive call
 
-    def finalize_variables(self, uniques, bay):
-        """Finalize variables and check to see packages get delivered on time before loading truck. O(N^2)."""
+    def finalize_variables(self, uniques):
+        """Finalize variables and check to see packages get delivered on time before loading truck. Returns False if
+        the loading function must restart. O(N)."""
+        # A route that ends after the driver's shift is planned again, and kept once the restart limit is reached.
+        if self.truck.shift is not None:
+            times = self.route_seconds(uniques, self.fastest_route[1], self.departure)
+            if times and times[-1] > self.truck.shift[1]:
+                if self.restartable and self.restarts < LOAD_RESTART_LIMIT:
+                    self.restarts = self.restarts + 1
+                    print("Error: Truck " + str(self.truck.identifier) + " will not finish its route before its "
+                          "shift ends. Restarting function.")
+                    return False
+                print("Error: Truck " + str(self.truck.identifier) + " will finish its route after its shift ends.")
+
         # Translate the subset matrix address IDs back to full matrix address IDs.
         for indexes, location in enumerate(self.fastest_route[1][:]):
             self.fastest_route[1][indexes] = uniques[location]
 
-        # If packages do not get delivered on time, reset loading function. Otherwise, remove packages from warehouse.
-        if self.fastest_route[1][-2] in self.urgent_addresses and self.truck.identifier == 2:
+        # If packages do not get delivered on time, restart loading function. Some loads end at an urgent address on
+        # every seed, so the route is kept once the restart limit is reached.
+        if self.fastest_route[1][-2] in self.urgent_addresses and self.truck.identifier == 2 and \
+                self.restartable and self.restarts < LOAD_RESTART_LIMIT:
+            self.restarts = self.restarts + 1
             print("Error: One of the packages will not make it to its destination on time. Restarting function.")
-            self.reset = True
-        else:
-            for package in bay:
-                self.warehouse.remove(package)
+            return False
+        return True
 
     def finalize_truck(self, count, bay):
         """Load the truck with the packages, location history, and distance history in respective order. O(N^2)."""
-        # Restarts the loading function if packages do not get delivered on time.
-        if self.reset:
-            self.load_truck(self.truck)
-            return
-
         # Translates Hamiltonian_Cycle variables to truck object variables.
         self.truck.count = count
+        self.truck.cargo = sum(package[4] for package in bay)
         self.truck.available = False
-        self.truck.locations = self.fastest_route[1][:]
-        self.truck.locations.pop(0)
-        self.truck.distances = self.fastest_route[2][:]
+        self.truck.locations = self.fastest_route[1][1:]
+        self.truck.sync_stops()
+        self.truck.distances = self.fastest_route[2]
         self.truck.cost = self.fastest_route[0]
 
         # Loads truck with package IDs in delivery order.
@@ -593,33 +1367,44 @@ class Hub:
                 if package[-1] == indexes:
                     self.truck.package_ids.append(int(package[0]))
                     self.truck.bay.append(package)
-        self.truck.next_distance = self.truck.distances[0]
+
+        # The truck owns the route now. The Hub lets go of the route and the subset matrix until the next load.
+        self.fastest_route = [INT_MAX, [INT_MAX], INT_MAX]
+        self.subset_matrix = []
+        self.truck.plan_arrivals(self.simulation.time.total_seconds())
 
         # Update package hash table statuses.
         for package in self.truck.package_ids:
             self.simulation.hash_table[package][-1] = "Loaded on Truck " + str(self.truck.identifier)
+        if self.simulation.sink:
+            self.simulation.sink.loaded(self.simulation, self.truck)
 
         # Print Simulation and accept another GUI input.
         print("\n\n\n\n\n\n" + self.truck.buffer + "[Departed HUB Fully Loaded]\n" + str(self.simulation))
         self.simulation.event = True
 
-    def unloading(self, package, bay, ids, indexes, hub, count):
-        """Removes a package from the truck bay. Adjusts all variables and then returns them. O(N)."""
-        bay.remove(package)
-        ids.remove(package[0])
-        indexes.remove(package[-1])
-        hub.append(package)
-        count = count - 1
-        return bay, ids, indexes, hub, count
-
-    def loading(self, package, bay, ids, indexes, hub, count):
-        """Loads a package onto the truck bay. Adjusts all variables and then returns them. O(N)."""
-        bay.append(package)
-        ids.append(package[0])
-        indexes.append(package[-1])
-        hub.remove(package)
-        count = count + 1
-        return bay, ids, indexes, hub, count
+    def package_eta(self, package_id):
+        """Returns the predicted delivery second of a package waiting at the Hub, or None if it is not at the Hub or no
+        truck will come back for it. The package leaves with the first truck of this Hub to be ready, but not before
+        it is available, and is driven straight to its address. O(N + T)."""
+        key = str(package_id)
+        now = self.simulation.time.total_seconds()
+        package = self.warehouse.get(key)
+        ready = now
+        if package is None:
+            package = next((x for x in self.do_not_ship_packages if x[0] == key), None)
+            if package is None:
+                return None
+            if package[2] == "Bad Address":
+                ready = max(now, self.simulation.bad_address_time)
+            else:
+                ready = max(now, self.simulation.flight_delay_time)
+        returns = [truck.return_time() for truck in self.simulation.trucks if truck.home == self.depot]
+        returns = [seconds for seconds in returns if seconds is not None]
+        if not returns:
+            return None
+        departure = max(ready, min(returns))
+        return departure + self.leg_seconds(package[-1], departure)
 
     def flight_arrival(self):
         """Transforms all delayed packages located in the Hub. Make Truck 2 available. O(N^2)."""
@@ -634,7 +1419,7 @@ class Hub:
                     pass
                 # Updates package status and move package to warehouse.
                 self.simulation.hash_table[int(available[0])][-1] = "Ready for pickup"
-                self.warehouse.append(available)
+                self.warehouse[available[0]] = available
 
         # Print event and accept another GUI input.
         print("\nSPECIAL EVENT: Packages that were delayed at the airport are now available for pickup -"
@@ -657,7 +1442,7 @@ class Hub:
             self.simulation.hash_table[int(available[0])][-1] = "Ready for pickup"
             self.simulation.hash_table[int(available[0])][1] = "410 S State St"
             self.simulation.hash_table[int(available[0])][3] = "84111"
-            self.warehouse.append(available)
+            self.warehouse[available[0]] = available
 
         # Print event and accept another GUI input.
         print("\nSPECIAL EVENT: Packages that had bad addresses are now fixed and are available for pickup -"
@@ -0,0 +1,77 @@
+from settings import *
+
+
+def shortest_path(matrix, end=None, bound=INT_MAX):
+    """Finds the lowest cost path through a subset matrix that starts at the Hub at index 0 and visits every other
+    index once. The path ends at whichever stop is cheapest, or at index end when end is given. An end of 0 returns to
+    the Hub, which makes a closed tour. Returns the cost, the location history, and the distance history as in
+    Hub.fastest_route. The cost is bound and the histories are [INT_MAX] and INT_MAX if no path costs no more than
+    bound.
+
+    The search is a depth first branch and bound. Stops are tried nearest first, and a branch is cut once its cost plus
+    a lower bound on the rest of the path is more than the best cost. Every stop not visited yet must still be entered
+    once and, except for the last stop of a free path, left once, so the bound is the larger of the cheapest ways in
+    and the cheapest ways out. A free path has no closing leg to the Hub to pay for, which is where the search for a
+    last trip saves the most over the closed tour search. Among paths of equal cost, the path the serial
+    hamiltonian_cycle_slow search would keep is kept, so routes match except where rounding hides a tie. O(N!) worst
+    case."""
+    size = len(matrix)
+    stops = [stop for stop in range(1, size) if stop != end]
+    targets = stops + ([end] if end is not None else [])
+
+    # Cheapest way into every target and out of the Hub and every stop.
+    sources = [0] + stops
+    entry = [min([matrix[source][target] for source in sources if source != target] or [0.0])
+             if target in targets else 0.0 for target in range(size)]
+    leave = [min([matrix[source][target] for target in targets if target != source] or [0.0])
+             for source in range(size)]
+
+    # The path found by always driving to the nearest stop is the first record.
+    best = [bound, [INT_MAX], INT_MAX]
+    locations, distances, position, left = [0], [], 0, set(stops)
+    while left:
+        position = min(left, key=lambda x: (matrix[locations[-1]][x], x))
+        distances.append(matrix[locations[-1]][position])
+        locations.append(position)
+        left.remove(position)
+    if end is not None:
+        distances.append(matrix[position][end])
+        locations.append(end)
+    cost = round(sum(distances), 2)
+    if cost <= bound:
+        best = [cost, locations, distances]
+
+    order = [sorted(stops, key=lambda x: (matrix[source][x], x)) for source in range(size)]
+    visited = [False] * size
+    visited[0] = True
+    search(matrix, end, order, entry, leave, visited, len(stops), 0, 0, [0], [], best)
+    return best
+
+
+def search(matrix, end, order, entry, leave, visited, left, position, cost, locations, distances, best):
+    """The recursive branch and bound search of shortest_path. Left is the number of stops not visited yet. O(N!)."""
+    if not left:
+        if end is not None:
+            locations = locations + [end]
+            distances = distances + [matrix[position][end]]
+            cost = cost + matrix[position][end]
+        cost = round(cost, 2)
+        if cost < best[0] or (cost == best[0] and (best[1] == [INT_MAX] or locations > best[1])):
+            best[0], best[1], best[2] = cost, locations, distances
+        return
+
+    # Lower bound on the rest of the path. A free path's last stop is never left. Costs are rounded only once the path
+    # is complete, so a path whose sum is a rounding error above the best cost is not cut.
+    unvisited = [stop for stop in order[position] if not visited[stop]]
+    ways_in = sum(entry[stop] for stop in unvisited) + (entry[end] if end is not None else 0.0)
+    ways_out = leave[position] + sum(leave[stop] for stop in unvisited)
+    if end is None:
+        ways_out = ways_out - max(leave[stop] for stop in unvisited)
+    if cost + max(ways_in, ways_out) > best[0] + 1e-9:
+        return
+
+    for _next in unvisited:
+        visited[_next] = True
+        search(matrix, end, order, entry, leave, visited, left - 1, _next, cost + matrix[position][_next],
+               locations + [_next], distances + [matrix[position][_next]], best)
+        visited[_next] = False
@@ -0,0 +1,201 @@
+import array
+import os
+import pickle
+import random
+import struct
+import sys
+from settings import *
+
+
+# Event log record types.
+LOAD = 1  # Truck departs the hub. Payload is the route cost, package IDs, route, and route distances.
+DELIVER = 2  # Truck delivers packages. Payload is the address ID and the package IDs.
+ARRIVE = 3  # Truck arrives at the hub. Payload is the address ID.
+RNG = 4  # Random number generator state before a truck is loaded. Payload is the pickled state.
+CHECKPOINT = 5  # Checkpoint was written. Payload is the checkpoint file name.
+
+HEADER = struct.Struct('<BBII')  # Record type, truck ID, simulation second, payload length.
+ROUTE = struct.Struct('<dII')  # Route cost, package ID count, route location count.
+DAY_STATE = ['day', 'days', 'day_reports', 'flight_delay_time', 'bad_address_time', 'day_end_time']
+TRUCK_STATE = ['home', 'miles', 'arrival', 'current', 'count', 'bay', 'package_ids', 'locations', 'distances',
+               'weight', 'cargo', 'last_trip', 'available', 'unload_ids', 'cost', 'stop_times', 'stops_done',
+               'eta_shift', 'package_stops', 'breaks_taken']
+
+
+class Recorder:
+    """This is the recorder class that appends a compact binary event log of every load, delivery, and hub arrival,
+    along with the random number generator state before each load. Every CHECKPOINT_INTERVAL seconds of simulation
+    time it writes a checkpoint of the hubs, trucks, hash table, day, and clock."""
+    def __init__(self, log_file=REPLAY_LOG_FILE, directory=CHECKPOINT_DIRECTORY, interval=CHECKPOINT_INTERVAL):
+        """Initialize recorder variables and open the event log."""
+        self.directory = directory  # Folder that checkpoints are written to.
+        self.interval = interval  # Simulation seconds between checkpoints.
+        self.next_checkpoint = None  # Simulation second of the next checkpoint.
+        self.log = open(log_file, 'wb')  # Binary event log.
+
+    def write(self, kind, truck, seconds, payload=b""):
+        """Appends one record to the event log. O(K)."""
+        self.log.write(HEADER.pack(kind, truck, seconds, len(payload)))
+        self.log.write(payload)
+
+    def before_load(self, sim, truck):
+        """Records the random number generator state so the load can be solved again identically. O(1)."""
+        self.write(RNG, truck.identifier, sim.time.total_seconds(), pickle.dumps(random.getstate()))
+
+    def after_load(self, sim, truck):
+        """Records the packages, route, and route distances the truck departed with. O(N)."""
+        locations = [truck.current] + truck.locations
+        payload = ROUTE.pack(truck.cost, len(truck.package_ids), len(locations)) + \
+            array.array('I', truck.package_ids).tobytes() + array.array('I', locations).tobytes() + \
+            array.array('d', truck.distances).tobytes()
+        self.write(LOAD, truck.identifier, sim.time.total_seconds(), payload)
+
+    def delivered(self, sim, truck):
+        """Records the packages delivered at the truck's current location, or an arrival at the hub. O(N)."""
+        if truck.available and truck.current == truck.home:
+            self.write(ARRIVE, truck.identifier, sim.time.total_seconds(), struct.pack('<I', truck.current))
+        else:
+            ids = [int(package_id) for package_id in truck.unload_ids]
+            payload = struct.pack('<I', truck.current) + array.array('I', ids).tobytes()
+            self.write(DELIVER, truck.identifier, sim.time.total_seconds(), payload)
+
+    def tick(self, sim):
+        """Writes a checkpoint when the simulation time reaches the next checkpoint interval. Ticks may be fractional
+        or longer than 1 second. O(1) between checkpoints."""
+        seconds = sim.time.total_seconds()
+        if self.next_checkpoint is None:
+            self.next_checkpoint = (int(sim.time.previous) // self.interval + 1) * self.interval
+        if seconds >= self.next_checkpoint:
+            self.next_checkpoint = (seconds // self.interval + 1) * self.interval
+            file_name = checkpoint(sim, self.directory)
+            self.write(CHECKPOINT, 0, seconds, file_name.encode())
+            self.log.flush()
+
+    def close(self):
+        """Flushes and closes the event log. O(1)."""
+        if not self.log.closed:
+            self.log.close()
+
+
+class Replayer:
+    """This is the replayer class that reads an event log and hands logged loads back to the simulation, so routes
+    are applied without being solved again. If the log holds a random number generator state but no load for a
+    truck, the state is restored so the load is solved exactly as it was the first time."""
+    def __init__(self, log_file):
+        """Initialize replayer variables and index every load in the event log."""
+        self.decisions = {}  # Key = (simulation second, truck ID); Value = [random state, route record].
+        for kind, truck, seconds, payload in read_log(log_file):
+            if kind == RNG:
+                self.decisions[(seconds, truck)] = [pickle.loads(payload), None]
+            elif kind == LOAD:
+                self.decisions.setdefault((seconds, truck), [None, None])[1] = self.route(payload)
+
+    def route(self, payload):
+        """Unpacks a load record into its route cost, package IDs, route, and route distances. O(N)."""
+        cost, id_count, location_count = ROUTE.unpack_from(payload, 0)
+        values = array.array('I')
+        values.frombytes(payload[ROUTE.size:ROUTE.size + (id_count + location_count) * 4])
+        distances = array.array('d')
+        distances.frombytes(payload[ROUTE.size + (id_count + location_count) * 4:])
+        return cost, values[:id_count].tolist(), values[id_count:].tolist(), distances.tolist()
+
+    def load(self, sim, truck):
+        """Loads the truck with its logged route if one exists. Returns True if the route was applied. O(N)."""
+        decision = self.decisions.pop((sim.time.total_seconds(), truck.identifier), None)
+        if decision is None:
+            return False
+        state, route = decision
+        if route is None:
+            if state is not None:
+                random.setstate(state)
+            return False
+        cost, ids, locations, distances = route
+        truck.hub.truck_last_trip(truck)
+        truck.hub.load_planned(truck, ids, cost, locations, distances)
+        return True
+
+
+def read_log(log_file):
+    """Yields every record in an event log as (record type, truck ID, simulation second, payload). A record cut short
+    by a crash ends the log. O(N)."""
+    with open(log_file, 'rb') as file_python:
+        while True:
+            header = file_python.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            kind, truck, seconds, length = HEADER.unpack(header)
+            payload = file_python.read(length)
+            if len(payload) < length:
+                return
+            yield kind, truck, seconds, payload
+
+
+def checkpoint(sim, directory=CHECKPOINT_DIRECTORY):
+    """Writes the hub, trucks, hash table, package groups, day, clock, and random number generator state to a
+    checkpoint file. Returns the checkpoint file name. O(N)."""
+    os.makedirs(directory, exist_ok=True)
+    state = {
+        'seconds': sim.time.total_seconds(),
+        'random': random.getstate(),
+        'packages': sim.packages,
+        'hubs': [(hub.warehouse, hub.do_not_ship_packages, hub.do_not_ship_addresses, hub.parked) for hub in sim.hubs],
+        'trucks': [{name: getattr(truck, name, None) for name in TRUCK_STATE} for truck in sim.trucks],
+        'hash_table': (sim.hash_table.size, sim.hash_table.slots, sim.hash_table.data),
+        'groups': sim.prepper.package_groups,
+        'day': {name: getattr(sim, name) for name in DAY_STATE},
+    }
+    file_name = os.path.join(directory, "checkpoint_%06d.pickle" % state['seconds'])
+    with open(file_name + '.tmp', 'wb') as file_python:
+        pickle.dump(state, file_python, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(file_name + '.tmp', file_name)
+    return file_name
+
+
+def restore(sim, file_name):
+    """Restores the simulation from a checkpoint file. The simulation must already be set up. Packages received on
+    later days are added to their Hub's distances again, and the hash table count is rebuilt from its slots.
+    O(N + K^2)."""
+    with open(file_name, 'rb') as file_python:
+        state = pickle.load(file_python)
+    sim.time.set_seconds(state['seconds'])
+    random.setstate(state['random'])
+    sim.packages = state['packages']
+    for name, value in state['day'].items():
+        setattr(sim, name, value)
+    sim.prepper.package_groups = state['groups']
+    for hub, hub_state in zip(sim.hubs, state['hubs']):
+        hub.warehouse, hub.do_not_ship_packages, hub.do_not_ship_addresses, hub.parked = hub_state
+        hub.groups = sim.prepper.package_groups
+        hub.distances.add([x[-1] for x in list(hub.warehouse.values()) + hub.do_not_ship_packages])
+    for truck, truck_state in zip(sim.trucks, state['trucks']):
+        for name, value in truck_state.items():
+            setattr(truck, name, value)
+        truck.sync_stops()
+    sim.hash_table.size, sim.hash_table.slots, sim.hash_table.data = state['hash_table']
+    sim.hash_table.count = sum(1 for slot in sim.hash_table.slots if slot is not None)
+
+
+if __name__ == '__main__':
+    # Usage: python replay.py record
+    #        python replay.py restore <checkpoint file> [fast-forward time, such as 17:00:00]
+    from main import Prepper, Simulation
+    from objects import Clock
+    prepper = Prepper()
+    prepper.execute()
+    simulation = Simulation(prepper)
+    if sys.argv[1:2] == ['record']:
+        simulation.recorder = Recorder()
+        simulation.execute()
+    elif sys.argv[1:2] == ['restore']:
+        if os.path.exists(REPLAY_LOG_FILE):
+            simulation.replayer = Replayer(REPLAY_LOG_FILE)
+        simulation.setup()
+        restore(simulation, sys.argv[2])
+        if len(sys.argv) > 3:
+            simulation.fast_forward(Clock.parse(sys.argv[3]))
+        print(simulation.newline + str(simulation))
+        simulation.event = True
+        while not simulation.finished:
+            simulation.step()
+    else:
+        print("Usage: python replay.py record | restore <checkpoint file> [time]")
@@ -0,0 +1,179 @@
+import argparse
+import contextlib
+import csv
+import multiprocessing
+import os
+import random
+import time
+from city import CityGenerator
+from corpus import RouteCorpus
+from settings import *
+
+
+FIELDS = ['study', 'engine', 'addresses', 'packages', 'stops', 'seconds', 'miles', 'status']
+
+
+class ScalingStudy:
+    """This is the scaling study class that measures how runtime and miles grow with the size of a city. Cities are
+    made by the city generator. Two studies are run:
+
+        Simulation study) A headless simulation of a whole day for every address count and package count. Each
+        simulation runs in its own process and is stopped once it passes the time limit.
+
+        Engine study) Every route engine of the route corpus on routes with a growing number of stops, drawn from a
+        generated city for every address count. An engine that passes the time limit on one route size is not run on
+        larger sizes of the same city.
+
+    Results are rows with the fields in FIELDS. They are written to a CSV file and plotted when matplotlib is
+    installed."""
+    def __init__(self, directory=SCALING_DIRECTORY, timeout=SCALING_TIMEOUT, seed=CITY_SEED):
+        """Initialize study variables."""
+        self.directory = directory  # Directory that generated cities are written to.
+        self.timeout = timeout  # Seconds a simulation or an engine may run before it is stopped or dropped.
+        self.seed = seed  # Random seed for cities and package selection.
+        self.rows = []  # Results.
+
+    def run_simulations(self, address_counts, package_counts):
+        """Runs one headless simulation for every address count and package count. O(A * P * M * N!)."""
+        for addresses in address_counts:
+            for packages in package_counts:
+                try:
+                    city = CityGenerator(addresses, packages, self.seed).build()
+                except ValueError:
+                    self.add('simulation', 'simulation', addresses, packages, None, None, None, 'too many packages')
+                    continue
+                files = city.write(os.path.join(self.directory, "city_%d_%d" % (addresses, packages)))
+                seconds, miles, status = self.run_simulation(files[0], files[1])
+                self.add('simulation', 'simulation', addresses, packages, None, seconds, miles, status)
+
+    def run_simulation(self, distance_file, package_file):
+        """Runs a headless simulation of a generated city in another process. Returns the runtime, the miles, and
+        'finished', 'timeout', or 'failed'. O(M * N!)."""
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=simulate, args=(distance_file, package_file, self.seed, queue))
+        start = time.perf_counter()
+        process.start()
+        process.join(self.timeout)
+        seconds = time.perf_counter() - start
+        if process.is_alive():
+            process.terminate()
+            process.join()
+            return seconds, None, 'timeout'
+        if queue.empty():
+            return seconds, None, 'failed'
+        return seconds, queue.get(), 'finished'
+
+    def run_engines(self, address_counts, stop_counts, engines=None, instances=SCALING_INSTANCES):
+        """Runs every route engine on routes drawn from a generated city for every address count, from the fewest
+        stops to the most. Half of the routes return to the Hub and half are last trips. Runtime and miles are summed
+        over the routes of one size. O(A * E * S * K!)."""
+        corpus = RouteCorpus()
+        for addresses in address_counts:
+            city = CityGenerator(addresses, 0, self.seed).build()
+            generator = random.Random(self.seed)
+            dropped = set()
+            for stops in [x for x in stop_counts if x < addresses]:
+                routes = []
+                for number in range(instances):
+                    subset = [0] + generator.sample(range(1, addresses), stops)
+                    routes.append(([[city.matrix[row][column] for column in subset] for row in subset],
+                                   number % 2 == 1))
+                for name in engines or list(corpus.engines):
+                    if name in dropped:
+                        self.add('engine', name, addresses, None, stops, None, None, 'skipped')
+                        continue
+                    engine = corpus.engines[name]
+                    start = time.perf_counter()
+                    miles = sum(engine(matrix, last_trip)[0] for matrix, last_trip in routes)
+                    seconds = time.perf_counter() - start
+                    if seconds > self.timeout:
+                        dropped.add(name)
+                    self.add('engine', name, addresses, None, stops, seconds, round(miles, 1), 'finished')
+        if corpus.solver is not None:
+            corpus.solver.close()
+
+    def add(self, study, engine, addresses, packages, stops, seconds, miles, status):
+        """Adds a result row and prints it. O(1)."""
+        row = dict(zip(FIELDS, [study, engine, addresses, packages, stops,
+                                None if seconds is None else round(seconds, 3), miles, status]))
+        self.rows.append(row)
+        print("%-10s %-8s  addresses %4s  packages %5s  stops %3s  %9s s  %8s miles  %s" % tuple(
+            '-' if row[field] is None else row[field] for field in FIELDS))
+
+    def save(self, file_name=SCALING_FILE):
+        """Writes the results to a CSV file. O(R)."""
+        with open(file_name, 'w', newline='') as file_python:
+            writer = csv.DictWriter(file_python, FIELDS)
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+    def plot(self, file_name=SCALING_PLOT_FILE):
+        """Plots runtime and miles against package count for the simulations, and against stop count for the route
+        engines. Returns False if matplotlib is not installed. O(R)."""
+        try:
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as pyplot
+        except ImportError:
+            return False
+        figure, axes = pyplot.subplots(2, 2, figsize=(12, 9))
+        simulations = [row for row in self.rows if row['study'] == 'simulation' and row['status'] == 'finished']
+        for addresses in sorted({row['addresses'] for row in simulations}):
+            rows = sorted((row for row in simulations if row['addresses'] == addresses), key=lambda x: x['packages'])
+            label = "%d addresses" % addresses
+            axes[0][0].plot([row['packages'] for row in rows], [row['seconds'] for row in rows], 'o-', label=label)
+            axes[0][1].plot([row['packages'] for row in rows], [row['miles'] for row in rows], 'o-', label=label)
+        engines = [row for row in self.rows if row['study'] == 'engine' and row['status'] == 'finished']
+        for name, addresses in sorted({(row['engine'], row['addresses']) for row in engines}):
+            rows = sorted((row for row in engines if row['engine'] == name and row['addresses'] == addresses),
+                          key=lambda x: x['stops'])
+            label = "%s, %d addresses" % (name, addresses)
+            axes[1][0].plot([row['stops'] for row in rows], [row['seconds'] for row in rows], 'o-', label=label)
+            axes[1][1].plot([row['stops'] for row in rows], [row['miles'] for row in rows], 'o-', label=label)
+        axes[1][0].set_yscale('log')
+        titles = [("Simulation runtime", "Packages", "Seconds"), ("Simulation miles", "Packages", "Miles"),
+                  ("Route engine runtime", "Stops", "Seconds"), ("Route engine miles", "Stops", "Miles")]
+        for axis, (title, x_label, y_label) in zip([axes[0][0], axes[0][1], axes[1][0], axes[1][1]], titles):
+            axis.set_title(title)
+            axis.set_xlabel(x_label)
+            axis.set_ylabel(y_label)
+            if axis.has_data():
+                axis.legend()
+        figure.tight_layout()
+        figure.savefig(file_name)
+        pyplot.close(figure)
+        return True
+
+
+def simulate(distance_file, package_file, seed, queue):
+    """Runs a headless simulation of one city and puts its miles on the queue. Runs in its own process."""
+    from main import Simulation, prepare
+    random.seed(seed)
+    simulation = Simulation(prepare(distance_file, package_file))
+    simulation.run_headless()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        simulation.execute()
+    queue.put(round(sum(truck.miles for truck in simulation.trucks), 1))
+
+
+if __name__ == '__main__':
+    # Usage: python scaling.py [--addresses 27 54] [--packages 40 80] [--stops 4 6 8] [--engines fast path exact]
+    parser = argparse.ArgumentParser(description="Measure runtime and miles against city size.")
+    parser.add_argument('--addresses', type=int, nargs='*', default=[27, 54], help="Address counts of the cities.")
+    parser.add_argument('--packages', type=int, nargs='*', default=[40, 80], help="Package counts of the cities.")
+    parser.add_argument('--stops', type=int, nargs='*', default=[4, 6, 8, 10], help="Route sizes for the engines.")
+    parser.add_argument('--engines', nargs='*', help="Route engines. Every engine of the route corpus by default.")
+    parser.add_argument('--timeout', type=float, default=SCALING_TIMEOUT, help="Seconds before a run is stopped.")
+    parser.add_argument('--seed', type=int, default=CITY_SEED, help="Random seed for cities and package selection.")
+    args = parser.parse_args()
+    study = ScalingStudy(timeout=args.timeout, seed=args.seed)
+    if args.addresses and args.packages:
+        study.run_simulations(args.addresses, args.packages)
+    if args.addresses and args.stops:
+        study.run_engines(args.addresses, args.stops, args.engines)
+    study.save()
+    print("Saved results to " + SCALING_FILE)
+    if study.plot():
+        print("Saved plot to " + SCALING_PLOT_FILE)
+    else:
+        print("Install matplotlib to plot the results.")
@@ -0,0 +1,142 @@
+import asyncio
+import contextlib
+import json
+import os
+from settings import *
+
+
+class DispatchService:
+    """This is the dispatch service class that runs the simulation as an asyncio task and answers queries over a local
+    socket. Each request and response is one line of JSON. Requests look like {"command": "package", "id": 5}.
+
+    Supported commands:
+
+        package) Returns package data for a package ID from the hash table.
+        address) Returns the address name and package IDs for an address ID.
+        table)   Returns every package ID and package data in the hash table.
+        status)  Returns the simulation time and the state of every truck.
+
+    Simulation ticks run in a worker thread a batch at a time, so queries are answered while trucks are loading."""
+    def __init__(self, sim, host=SERVICE_HOST, port=SERVICE_PORT, path=SERVICE_SOCKET):
+        """Initialize service variables."""
+        self.simulation = sim  # Reference to simulation.
+        self.host = host  # TCP host to listen on.
+        self.port = port  # TCP port to listen on.
+        self.path = path  # Unix socket path. Used instead of host and port when set.
+        self.server = None  # Asyncio server object.
+        self.clients = 0  # Number of connected clients.
+        self.commands = {'package': self.package, 'address': self.address, 'table': self.table, 'status': self.status}
+
+    async def serve(self):
+        """Starts the server and the simulation task. Serves queries until cancelled."""
+        if self.path:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path)
+            self.server = await asyncio.start_unix_server(self.handle, path=self.path, backlog=SERVICE_BACKLOG)
+        else:
+            self.server = await asyncio.start_server(self.handle, self.host, self.port, backlog=SERVICE_BACKLOG)
+        async with self.server:
+            simulation = asyncio.ensure_future(self.simulate())
+            try:
+                await self.server.serve_forever()
+            finally:
+                simulation.cancel()
+
+    async def simulate(self):
+        """Runs the simulation in batches of ticks. Yields to the event loop between batches."""
+        loop = asyncio.get_event_loop()
+        self.simulation.run_headless()
+        await loop.run_in_executor(None, self.quiet, self.simulation.setup)
+        while not self.simulation.finished:
+            await loop.run_in_executor(None, self.quiet, self.advance)
+            await asyncio.sleep(SERVICE_TICK_DELAY)
+
+    def advance(self):
+        """Runs one batch of simulation ticks. O(T * M * N!)."""
+        for _ in range(SERVICE_TICKS_PER_YIELD):
+            if self.simulation.finished:
+                break
+            self.simulation.step()
+
+    def quiet(self, function):
+        """Calls function with console prints discarded. The service has no console to print to."""
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            function()
+
+    async def handle(self, reader, writer):
+        """Answers every request line sent by one client until the client disconnects."""
+        self.clients = self.clients + 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write((json.dumps(self.respond(line)) + "\n").encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients = self.clients - 1
+            writer.close()
+
+    def respond(self, line):
+        """Parses one request line and returns the response. Errors are returned, never raised. O(N)."""
+        try:
+            request = json.loads(line)
+            command = self.commands[request['command']]
+            return {'ok': True, 'result': command(request)}
+        except (ValueError, TypeError, OverflowError) as error:
+            return {'ok': False, 'error': "Invalid request: " + str(error)}
+        except KeyError as error:
+            return {'ok': False, 'error': "Unknown command or missing field: " + str(error)}
+        except Exception as error:
+            # The connection must outlive a failed request, so no error is raised to the client handler.
+            return {'ok': False, 'error': "Request failed: " + repr(error)}
+
+    @staticmethod
+    def identifier(request):
+        """Returns the ID field of a request. An ID is a JSON integer, or a string of digits. O(1)."""
+        value = request['id']
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError("id must be an integer, not " + json.dumps(value))
+        return value
+
+    def package(self, request):
+        """Returns package data for a package ID. O(1)."""
+        data = self.simulation.package_data(self.identifier(request))
+        if data is None:
+            raise ValueError("no package " + str(request['id']))
+        return data
+
+    def address(self, request):
+        """Returns the address name and package IDs for an address ID. O(N)."""
+        address_id = self.identifier(request)
+        if not 0 <= address_id < len(self.simulation.index_addresses):
+            raise ValueError("no address " + str(address_id))
+        address, package_list = self.simulation.address_data(address_id)
+        return {'address': address, 'packages': package_list}
+
+    def table(self, request):
+        """Returns every package ID and package data in the hash table and the package archive. O(N)."""
+        return [[key, data] for key, data in self.simulation.package_records()]
+
+    def status(self, request):
+        """Returns the simulation time and the state of every truck. O(N)."""
+        trucks = []
+        for truck in self.simulation.trucks:
+            trucks.append({'truck': truck.identifier, 'miles': round(truck.miles, 1), 'location': truck.current,
+                           'route': truck.locations, 'packages': truck.package_ids, 'available': truck.available})
+        return {'time': str(self.simulation.time).strip(), 'finished': self.simulation.finished, 'trucks': trucks,
+                'clients': self.clients}
+
+
+if __name__ == '__main__':
+    from main import Prepper, Simulation
+    prepper = Prepper()
+    prepper.execute()
+    try:
+        asyncio.run(DispatchService(Simulation(prepper)).serve())
+    except KeyboardInterrupt:
+        pass
@@ -3,7 +3,6 @@ AUTHOR = "Ryan Kruse"
 GITHUB = "https://github.com/RyanKruse"
 TRUCK_STORAGE_LIMIT = 16
 TRUCK_SPEED_PER_MILE = 18
-TRUCK_SPEED_PER_SECOND = ((TRUCK_SPEED_PER_MILE / 60) / 60)
 INT_MAX = 99999
 SEED_COUNT = 30
 SIMULATION_START_TIME = "8:00:00"
@@ -11,3 +10,62 @@ FLIGHT_DELAY_TIME = "9:05:00"
 BAD_ADDRESS_TIME = "10:20:00"
 DISTANCE_FILE = 'supporting_files/Distance Matrix File.csv'
 PACKAGE_FILE = 'supporting_files/Package Table File.csv'
+NEIGHBOR_COUNT = 8
+NEIGHBOR_FILE = 'supporting_files/Neighbor List File.json'  # Named with a fingerprint of its inputs when written.
+DISTANCE_SOURCE = 'dense'  # One of 'dense', 'mapped', or 'coordinates'.
+DISTANCE_MAP_FILE = 'supporting_files/Distance Matrix File.bin'
+COORDINATE_FILE = 'supporting_files/Address Coordinate File.csv'
+COORDINATE_SCALE = 1.0
+DISTANCE_PAGE_ROWS = 64
+DISTANCE_CACHE_ROWS = 4096
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8950
+SERVICE_SOCKET = None  # Path of a Unix socket. Used instead of the TCP port when set.
+SERVICE_BACKLOG = 1024
+SERVICE_TICKS_PER_YIELD = 60
+SERVICE_TICK_DELAY = 0.01
+REPLAY_LOG_FILE = 'replay.log'
+CHECKPOINT_DIRECTORY = 'checkpoints'
+CHECKPOINT_INTERVAL = 1800
+DEPOT_ADDRESSES = [0]  # Address IDs of every Hub. Packages are assigned to the closest Hub.
+TRUCK_DEPOTS = {1: 0, 2: 0}  # Key = truck ID; Value = address ID of the Hub the truck is assigned to.
+DEPOT_WORKERS = 4  # Processes used to plan loads for separate Hubs at the same time.
+SHARED_DISTANCES = True  # Publishes the distance matrix to shared memory for worker processes instead of pickling it.
+TRUCK_WEIGHT_LIMITS = {1: 400, 2: 400}  # Key = truck ID; Value = maximum package weight the truck can carry.
+CORPUS_FILE = 'supporting_files/Route Corpus File.json'
+CORPUS_INSTANCES = 120
+CORPUS_SEED = 1
+CORPUS_MAX_STOPS = 8  # Stops after the Hub. The slow route engine is O(K!).
+SUBSET_CACHE_SIZE = 256  # Subset matrices kept by each Hub for reuse across seeds and loads.
+EVENT_FILE = None  # Path of the event stream file or pipe. Events are written only when set.
+EVENT_FORMAT = 'ndjson'  # One of 'ndjson' or 'csv'.
+EVENT_BATCH = 256  # Events buffered before they are written.
+EVENT_ROTATE_BYTES = 64 * 1024 * 1024  # Event file size that triggers a rotation. Zero disables rotation.
+EVENT_ROTATE_COUNT = 5  # Rotated event files kept.
+SOLVE_WORKERS = None  # Processes used by one exact route solve. None uses every core.
+SOLVE_SPLIT_DEPTH = 2  # Stops after the Hub that are fixed to split an exact route solve into branches.
+SOLVE_PARALLEL_STOPS = 11  # Smallest number of stops after the Hub that is solved on several cores.
+DAY_END_TIME = "17:00:00"  # Trucks are not loaded after this time in a rolling multi-day simulation.
+DAILY_PACKAGE_FILE = 'supporting_files/daily/Package Table File %s.csv'  # Dated package batch. %s is the ISO date.
+DAILY_START_DATE = "2021-01-04"  # Date of the first day. Its packages come from PACKAGE_FILE.
+ARCHIVE_DELIVERED = True  # Moves the records of delivered packages out of the hash table into a file.
+ARCHIVE_FILE = None  # Path of the delivered package archive. None uses a temporary file.
+TRUCK_RELAYS = {}  # Key = truck ID; Value = address ID of the relay point where the truck's last trip ends.
+CITY_ADDRESSES = 27  # Addresses in a generated city, including the Hub.
+CITY_PACKAGES = 40  # Packages in a generated city.
+CITY_SEED = 1
+CITY_SIZE = 12.0  # Width and height of a generated city in miles.
+CITY_GROUPS = 1  # Groups of three packages that must be delivered together.
+CITY_CIRCUITY = 1.3  # Road miles for each straight-line mile.
+CITY_ONE_WAY = 0.15  # Share of directions between two addresses with a one-way detour.
+CITY_ADDRESS_LIMIT = 4  # Most packages at one address of a generated city.
+LOAD_RESTART_LIMIT = 25  # Loading restarts for a late route before the route is kept anyway.
+SCALING_DIRECTORY = 'scaling'  # Directory that the scaling study writes generated cities to.
+SCALING_FILE = 'scaling.csv'  # Scaling study results.
+SCALING_PLOT_FILE = 'scaling.png'  # Scaling study plot. Written only when matplotlib is installed.
+SCALING_TIMEOUT = 300  # Seconds a scaling study simulation or route engine may run before it is stopped.
+SCALING_INSTANCES = 6  # Routes of each size that every route engine solves in the scaling study.
+TRUCK_SPEED_PROFILE = [("0:00:00", TRUCK_SPEED_PER_MILE)]  # (Clock time, miles per hour) pieces of the day's speeds.
+SPEED_BUCKET_SECONDS = 900  # Seconds in each time bucket of the travel time matrices used by the route search.
+TRUCK_SHIFTS = {}  # Key = truck ID; Value = (start, end) clock times of the driver's shift. Others work all day.
+TRUCK_BREAKS = {}  # Key = truck ID; Value = (clock time, minutes) breaks, taken at the first stop after the time.
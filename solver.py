@@ -0,0 +1,104 @@
+import concurrent.futures
+import itertools
+import multiprocessing
+from settings import *
+
+
+# Best route cost found by any worker. Set in each worker process by share_bound.
+shared_bound = None
+
+
+def share_bound(bound):
+    """Stores the shared best route cost in a worker process. Called once when the worker starts."""
+    global shared_bound
+    shared_bound = bound
+
+
+class BranchSolver:
+    """This is the branch solver class that runs one exact route solve on several cores. The first SOLVE_SPLIT_DEPTH
+    stops after the Hub are fixed to split the search tree into independent branches, and each branch is searched by
+    a worker process. Workers read and lower one best cost held in shared memory, so a short route found by one worker
+    prunes the search of every other worker.
+
+    Branches are combined in the order the serial search visits them, and a later branch wins a tie, so the route
+    matches the serial hamiltonian_cycle_slow search except where rounding hides a tie."""
+    def __init__(self, workers=SOLVE_WORKERS):
+        """Initialize solver variables. The process pool is started on the first solve."""
+        self.workers = workers  # Worker processes.
+        self.bound = None  # Shared best route cost.
+        self.lock = None  # Serializes updates to the shared best route cost.
+        self.executor = None  # Process pool.
+
+    def start(self):
+        """Starts the process pool with the shared best route cost. O(W)."""
+        self.bound = multiprocessing.RawValue('d', INT_MAX)
+        self.lock = multiprocessing.Lock()
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=share_bound,
+                                                               initargs=((self.bound, self.lock),))
+
+    def close(self):
+        """Shuts down the process pool. O(W)."""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def solve(self, matrix, last_trip, bound=INT_MAX):
+        """Finds the lowest cost route through a subset matrix that costs no more than bound. Returns the cost, the
+        location history, and the distance history as in Hub.fastest_route. The cost is bound and the histories are
+        [INT_MAX] and INT_MAX if no route is found. O(N! / W)."""
+        if self.executor is None:
+            self.start()
+        self.bound.value = bound
+        depth = min(SOLVE_SPLIT_DEPTH, len(matrix) - 1)
+        futures = [self.executor.submit(search_branch, matrix, last_trip, prefix)
+                   for prefix in itertools.permutations(range(1, len(matrix)), depth)]
+        best = [bound, [INT_MAX], INT_MAX]
+        for future in futures:
+            result = future.result()
+            if result is not None and result[0] <= best[0]:
+                best = result
+        return best
+
+
+def search_branch(matrix, last_trip, prefix):
+    """Searches every route that begins with the Hub and then the stops in prefix. Returns the lowest cost route as
+    [cost, locations, distances], or None if no route beats the shared best cost. O((N - D)!)."""
+    size = len(matrix)
+    bitmap = [False] * size
+    bitmap[0] = True
+    locations, distances, cost, position = [0], [], 0, 0
+    for stop in prefix:
+        bitmap[stop] = True
+        locations.append(stop)
+        distances.append(matrix[position][stop])
+        cost = cost + matrix[position][stop]
+        position = stop
+    best = [None]
+    search(matrix, last_trip, bitmap, position, cost, distances, locations, [True] * size, best)
+    return best[0]
+
+
+def search(matrix, last_trip, bitmap, position, cost, distances, locations, basecase, best):
+    """The recursive search of hamiltonian_cycle_slow, pruned by the shared best cost. O(N!)."""
+    bound, lock = shared_bound
+    if bitmap == basecase:
+        if last_trip:
+            cost = round(cost, 2)
+        else:
+            locations.append(0)
+            distances.append(matrix[position][0])
+            cost = round(cost + matrix[position][0], 2)
+        if cost <= bound.value:
+            best[0] = [cost, locations, distances]
+            with lock:
+                if cost < bound.value:
+                    bound.value = cost
+            return
+    if cost > bound.value:
+        return
+    for _next in range(1, len(matrix)):
+        if not bitmap[_next]:
+            new_bitmap = bitmap[:]
+            new_bitmap[_next] = True
+            search(matrix, last_trip, new_bitmap, _next, cost + matrix[position][_next],
+                   distances + [matrix[position][_next]], locations + [_next], basecase, best)
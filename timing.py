@@ -0,0 +1,61 @@
+import bisect
+from objects import Clock
+from settings import *
+
+
+class SpeedProfile:
+    """This is the speed profile class that turns miles into driving seconds. Truck speed is piecewise constant over the
+    day. Each piece starts at a clock time and holds its speed until the next piece starts, and the last piece runs
+    past midnight into the first piece of the next day. The time to drive a leg is found by integrating the speed over
+    the pieces the leg passes through, so a leg costs one step for each piece it crosses instead of one for each second.
+
+    The route search times routes with travel time matrices, one for each time bucket of the day. A bucket matrix holds
+    the seconds to drive each leg when leaving at the start of the bucket. A profile with one speed has one bucket."""
+    def __init__(self, pieces=TRUCK_SPEED_PROFILE, bucket=SPEED_BUCKET_SECONDS):
+        """Initialize speed profile variables."""
+        pieces = sorted((Clock.parse(start), speed) for start, speed in pieces)
+        if not pieces or any(speed <= 0 for _, speed in pieces):
+            raise ValueError("A speed profile needs at least one piece, and every speed must be above zero.")
+        if pieces[0][0] != 0:
+            pieces.insert(0, (0, pieces[-1][1]))
+        self.starts = [start for start, _ in pieces]  # Second of the day each piece starts, in order.
+        self.speeds = [speed for _, speed in pieces]  # Miles per hour of each piece.
+        self.bucket = bucket  # Seconds in each time bucket of the travel time matrices.
+        self.constant = len(set(self.speeds)) == 1  # Travel times do not depend on the time of day.
+
+    def speed(self, second):
+        """Returns the speed in miles per hour at a second since midnight of any day. O(log P)."""
+        return self.speeds[bisect.bisect_right(self.starts, second % 86400) - 1]
+
+    def travel_seconds(self, miles, departure):
+        """Returns the seconds it takes to drive a number of miles, leaving at departure in seconds since midnight of
+        any day. The miles covered in each piece are its speed times the time spent in it, so the leg ends in the piece
+        where the miles left are covered. O(P)."""
+        if self.constant:
+            return miles * 3600 / self.speeds[0]
+        index = bisect.bisect_right(self.starts, departure % 86400) - 1
+        midnight = departure - departure % 86400
+        moment = departure
+        while True:
+            end = midnight + (self.starts[index + 1] if index + 1 < len(self.starts) else 86400)
+            reach = (end - moment) * self.speeds[index] / 3600
+            if reach >= miles:
+                return moment + miles * 3600 / self.speeds[index] - departure
+            miles = miles - reach
+            moment = end
+            index = index + 1
+            if index == len(self.starts):
+                index, midnight = 0, midnight + 86400
+
+    def bucket_of(self, second):
+        """Returns the time bucket that holds a second since midnight of any day. O(1)."""
+        if self.constant:
+            return 0
+        return int(second % 86400 // self.bucket)
+
+    def bucket_matrix(self, matrix, bucket):
+        """Returns the travel time matrix of a distance matrix for one time bucket. Every leg leaves at the start of the
+        bucket. O(K^2 * P)."""
+        start = bucket * self.bucket
+        return [[self.travel_seconds(distance, start) for distance in row] for row in matrix]
+